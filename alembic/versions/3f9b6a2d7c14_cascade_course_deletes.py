@@ -0,0 +1,45 @@
+"""cascade course deletes
+
+Revision ID: 3f9b6a2d7c14
+Revises: 8c4a1f6d2e07
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9b6a2d7c14'
+down_revision: Union[str, None] = '8c4a1f6d2e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column, referred table) of the foreign keys that delete a course's rows along with it
+FOREIGN_KEYS = (
+    ('courses_students', 'course_id', 'courses'),
+    ('publications', 'course_id', 'courses'),
+    ('submissions', 'publication', 'publications'),
+    ('media', 'publication', 'publications'),
+    ('media', 'submission', 'submissions'),
+)
+
+
+def replace_foreign_keys(ondelete) -> None:
+    for table, column, referred in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete=ondelete, postgresql_not_valid=True)
+    # the existing rows are checked after the swap is committed, under a lock that doesn't block writes
+    with op.get_context().autocommit_block():
+        for table, column, _ in FOREIGN_KEYS:
+            op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_fkey')
+
+
+def upgrade() -> None:
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade() -> None:
+    replace_foreign_keys(None)
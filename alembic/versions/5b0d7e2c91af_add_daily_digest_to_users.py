@@ -0,0 +1,26 @@
+"""add daily digest to users
+
+Revision ID: 5b0d7e2c91af
+Revises: e33352f54edb
+Create Date: 2026-10-17 14:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0d7e2c91af'
+down_revision: Union[str, None] = 'e33352f54edb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('daily_digest', sa.Boolean(), server_default='false', nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'daily_digest')
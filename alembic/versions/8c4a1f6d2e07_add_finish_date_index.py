@@ -0,0 +1,32 @@
+"""add finish date index
+
+Revision ID: 8c4a1f6d2e07
+Revises: 5b0d7e2c91af
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4a1f6d2e07'
+down_revision: Union[str, None] = '5b0d7e2c91af'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the reminder scheduler reads upcoming deadlines in finish_date order when it starts
+    with op.get_context().autocommit_block():
+        op.create_index('ix_publications_finish_date', 'publications', ['finish_date'], unique=False,
+                        if_not_exists=True, postgresql_concurrently=True,
+                        postgresql_where=sa.text('finish_date IS NOT NULL'))
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_publications_finish_date', table_name='publications', if_exists=True,
+                      postgresql_concurrently=True)
@@ -0,0 +1,41 @@
+"""media unique per owner
+
+Revision ID: b7e2d4c8a913
+Revises: 3f9b6a2d7c14
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d4c8a913'
+down_revision: Union[str, None] = '3f9b6a2d7c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Telegram hands out the same file_id whenever a file is sent again, so a file may belong to several
+# publications and submissions, but only once to each
+CONSTRAINTS = (
+    ('uq_media_file_id_publication', ['file_id', 'publication']),
+    ('uq_media_file_id_submission', ['file_id', 'submission']),
+)
+
+
+def upgrade() -> None:
+    # the unique indexes are built without locking writes, then become the constraints as they are
+    with op.get_context().autocommit_block():
+        for name, columns in CONSTRAINTS:
+            op.create_index(name, 'media', columns, unique=True, if_not_exists=True, postgresql_concurrently=True)
+    for name, _ in CONSTRAINTS:
+        op.execute(f'ALTER TABLE media ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
+    op.drop_constraint('media_file_id_key', 'media', type_='unique')
+
+
+def downgrade() -> None:
+    # fails if a file has been stored for more than one publication or submission meanwhile
+    op.create_unique_constraint('media_file_id_key', 'media', ['file_id'])
+    for name, _ in reversed(CONSTRAINTS):
+        op.drop_constraint(name, 'media', type_='unique')
@@ -0,0 +1,43 @@
+"""add indexes for query patterns
+
+Revision ID: e33352f54edb
+Revises: a29cf44af03d
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e33352f54edb'
+down_revision: Union[str, None] = 'a29cf44af03d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ('ix_publications_course_id_add_date_id', 'publications',
+     ['course_id', sa.text('add_date DESC'), sa.text('id DESC')]),
+    ('ix_submissions_publication_add_date_id', 'submissions', ['publication', 'add_date', 'id']),
+    ('ix_submissions_publication_student', 'submissions', ['publication', 'student']),
+    ('ix_media_publication', 'media', ['publication']),
+    ('ix_media_submission', 'media', ['submission']),
+    ('ix_courses_teacher_id', 'courses', ['teacher', 'id']),
+    ('ix_courses_students_course_id_student_id', 'courses_students', ['course_id', 'student_id']),
+)
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY doesn't lock writes, but can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
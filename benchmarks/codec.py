@@ -0,0 +1,94 @@
+"""
+Micro-benchmark of the cache codec against the JSON serializer it replaced.
+
+Run with `python -m benchmarks.codec`.
+"""
+import json
+import timeit
+from datetime import datetime, timedelta
+
+from bot.db import codec, Publications, Users
+
+ROUNDS = 200
+
+
+def json_serializer(obj):
+    """The previous db_object_serializer, kept here as the baseline"""
+    items = obj if type(obj) == list else [obj]
+    serialized_data = []
+    for item in items:
+        serialized_single_data = {}
+        for key, value in item.__dict__.items():
+            if key not in ['metadata', 'registry', '_sa_instance_state']:
+                if isinstance(value, datetime):
+                    serialized_single_data[key] = value.isoformat()
+                else:
+                    serialized_single_data[key] = value
+        serialized_data.append(serialized_single_data)
+    return json.dumps(serialized_data if type(obj) == list else serialized_data[0])
+
+
+def json_deserializer(raw, model):
+    """The previous db_object_deserializer plus the ORM rebuild done by the get_* functions"""
+    data = json.loads(raw)
+    items = data if type(data) == list else [data]
+    for item in items:
+        for attr in ("reg_date", "upd_date", "add_date", "finish_date"):
+            if item.get(attr) is not None:
+                item[attr] = datetime.fromisoformat(item[attr])
+    objects = [model(**item) for item in items]
+    return objects if type(data) == list else objects[0]
+
+
+def sample_data():
+    now = datetime.now().replace(microsecond=0)
+    user = Users(user_id=5234523452, username='student', first_name='Student', second_name='Name', is_teacher=False,
+                 reg_date=now, upd_date=now)
+    students = [Users(user_id=5234523452 + i, username=f'student_{i}', first_name='Student', second_name=None,
+                      is_teacher=False, reg_date=now, upd_date=now) for i in range(300)]
+    posts = [Publications(id=i, title=f'Homework {i}', text='Solve the exercises from the chapter. ' * 60,
+                          course_id=1, max_grade=100, add_date=now - timedelta(days=i), finish_date=now)
+             for i in range(50)]
+    return [('single user', user, codec.users, False, Users),
+            ('300 students', students, codec.users, True, Users),
+            ('50 publications', posts, codec.publications, True, Publications)]
+
+
+def encode(schema, value, many):
+    """Encodes a value the way the cache stores it, collections as a list of separately encoded rows"""
+    if many:
+        return [schema.encode(obj) for obj in value]
+    return schema.encode(value)
+
+
+def decode(schema, raw, many):
+    if many:
+        return [schema.decode(item) for item in raw]
+    return schema.decode(raw)
+
+
+def encoded_size(raw, many):
+    return sum(map(len, raw)) if many else len(raw)
+
+
+def measure(func):
+    return min(timeit.repeat(func, number=ROUNDS, repeat=5)) / ROUNDS * 1e6
+
+
+def main():
+    print(f'{"payload":<16}{"codec":<8}{"encode, us":>12}{"decode, us":>12}{"size, B":>10}')
+    for name, value, schema, many, model in sample_data():
+        json_raw = json_serializer(value)
+        packed_raw = encode(schema, value, many)
+        results = (
+            ('json', measure(lambda: json_serializer(value)), measure(lambda: json_deserializer(json_raw, model)),
+             len(json_raw.encode())),
+            ('msgpack', measure(lambda: encode(schema, value, many)), measure(lambda: decode(schema, packed_raw, many)),
+             encoded_size(packed_raw, many)),
+        )
+        for codec_name, encode_time, decode_time, size in results:
+            print(f'{name:<16}{codec_name:<8}{encode_time:>12.1f}{decode_time:>12.1f}{size:>10}')
+
+
+if __name__ == '__main__':
+    main()
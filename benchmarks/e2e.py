@@ -0,0 +1,270 @@
+"""
+End-to-end benchmark: synthetic updates replayed through the real dispatcher.
+
+Builds the dispatcher with create_dispatcher from bot/__main__.py (routers, session and role middlewares, metrics)
+and feeds it generated updates of a few flows: students browsing publications, teachers grading submissions and a
+storm of students joining one course. Bot API calls are answered by an in-process fake session after
+`api_latency_ms`. Postgres comes from DB-URL, the data lives in a throwaway `e2e_bench` schema that is dropped
+afterwards. Redis comes from BENCH-REDIS-HOST, which must be a disposable instance: the FSM, cache and queue
+databases are FLUSHED. The benchmark refuses to run against REDIS-HOST or REDIS-QUEUE-HOST, or when those databases
+hold keys that an earlier benchmark run didn't leave.
+
+For every flow it prints updates/sec, p50/p99 latency and SQL statements, Redis round trips and Bot API requests
+per update.
+
+Run with `python -m benchmarks.e2e [users] [concurrency] [api_latency_ms]`.
+"""
+import asyncio
+import itertools
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import List, get_args, get_origin
+
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ.setdefault('TOKEN', '123456:benchmark')
+BENCH_REDIS_HOST = os.getenv('BENCH-REDIS-HOST')
+if not BENCH_REDIS_HOST or BENCH_REDIS_HOST in (os.getenv('REDIS-HOST', 'redis'), os.getenv('REDIS-QUEUE-HOST')):
+    sys.exit("Set BENCH-REDIS-HOST to a disposable Redis other than the bot's, its databases are flushed")
+os.environ['REDIS-HOST'] = os.environ['REDIS-QUEUE-HOST'] = BENCH_REDIS_HOST
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.types import Chat, Message, Update, User  # noqa: E402
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from bot import metrics  # noqa: E402
+from bot.__main__ import create_dispatcher, redis_cache, redis_fsm, redis_queue  # noqa: E402
+from bot.db import BaseModel, Courses, Publications, Submissions  # noqa: E402
+from bot.handlers.common.services import Pagination  # noqa: E402
+
+SCHEMA = 'e2e_bench'
+TEACHERS = 20
+COURSES = 40
+STUDENTS = 2000
+JOINERS = 1000
+PUBLICATIONS_PER_COURSE = 30
+# a student takes the courses where (student + course) % ENROLMENT == 0, about COURSES / ENROLMENT of them
+ENROLMENT = 13
+KEY = 'abcdef'
+# set in every Redis database the benchmark flushed, so the next run knows they are its own
+MARKER = 'e2e:bench'
+
+SEED = [
+    f'''INSERT INTO users (user_id, username, is_teacher, reg_date, upd_date)
+        SELECT g, 'user_' || g, g <= {TEACHERS}, now(), now()
+        FROM generate_series(1, {TEACHERS + STUDENTS + JOINERS}) g''',
+    f'''INSERT INTO courses (id, name, key, teacher)
+        SELECT g, 'course ' || g, '{KEY}', (g - 1) % {TEACHERS} + 1 FROM generate_series(1, {COURSES}) g''',
+    f'''INSERT INTO courses_students (course_id, student_id)
+        SELECT c, s FROM generate_series(1, {COURSES}) c,
+                         generate_series({TEACHERS + 1}, {TEACHERS + STUDENTS}) s
+        WHERE (c + s) % {ENROLMENT} = 0''',
+    f'''INSERT INTO publications (id, title, text, course_id, max_grade, add_date, finish_date)
+        SELECT g, 'publication ' || g, repeat('text ', 50), (g - 1) / {PUBLICATIONS_PER_COURSE} + 1, 10,
+               now() - g * interval '1 minute', now() + g * interval '1 hour'
+        FROM generate_series(1, {COURSES * PUBLICATIONS_PER_COURSE}) g''',
+    f'''INSERT INTO submissions (text, publication, student, add_date, update_date)
+        SELECT 'answer', p.id, cs.student_id, now(), now()
+        FROM publications p JOIN courses_students cs ON cs.course_id = p.course_id
+        WHERE (p.id + cs.student_id) % 3 = 0''',
+    f'''INSERT INTO media (file_id, media_type, publication)
+        SELECT 'file_' || g, 'photo', (g - 1) / 2 + 1 FROM generate_series(1, {COURSES * PUBLICATIONS_PER_COURSE * 2}) g''',
+]
+
+
+class FakeSession(BaseSession):
+    """Answers every Bot API method in process after a fixed delay"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.message_ids = itertools.count(1)
+
+    def message(self, method):
+        chat_id = getattr(method, 'chat_id', None) or 1
+        return Message(message_id=next(self.message_ids), date=datetime.now(),
+                       chat=Chat(id=chat_id, type='private'), text=getattr(method, 'text', None))
+
+    async def make_request(self, bot, method, timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        returning = method.__returning__
+        if returning is Message:
+            return self.message(method)
+        if get_origin(returning) in (list, List) and get_args(returning)[0] is Message:
+            return [self.message(method) for _ in getattr(method, 'media', [None])]
+        if returning is User:
+            return User(id=bot.id, is_bot=True, first_name='benchmark')
+        # bool, or Union[Message, bool] of the edit methods
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+class Updates:
+    """Builds raw updates from simulated users"""
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.ids = itertools.count(1)
+
+    def user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'user {user_id}'}
+
+    def chat(self, user_id):
+        return {'id': user_id, 'type': 'private'}
+
+    def message(self, user_id, text):
+        update_id = next(self.ids)
+        return Update.model_validate({'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': int(time.time()), 'chat': self.chat(user_id),
+            'from': self.user(user_id), 'text': text}}, context={'bot': self.bot})
+
+    def callback(self, user_id, data):
+        update_id = next(self.ids)
+        return Update.model_validate({'update_id': update_id, 'callback_query': {
+            'id': str(update_id), 'from': self.user(user_id), 'chat_instance': str(user_id), 'data': data,
+            'message': {'message_id': update_id, 'date': int(time.time()), 'chat': self.chat(user_id),
+                        'from': {'id': self.bot.id, 'is_bot': True, 'first_name': 'bot'}, 'text': 'menu'}}},
+            context={'bot': self.bot})
+
+
+def student_courses(student):
+    return [course for course in range(1, COURSES + 1) if (course + student) % ENROLMENT == 0]
+
+
+def publications_of(course):
+    return range((course - 1) * PUBLICATIONS_PER_COURSE + 1, course * PUBLICATIONS_PER_COURSE + 1)
+
+
+def browsing(updates: Updates, users: int):
+    """Students open one of their courses, page through its publications and open one"""
+    for student in range(TEACHERS + 1, TEACHERS + 1 + users):
+        course = student_courses(student)[0]
+        publication = publications_of(course)[student % PUBLICATIONS_PER_COURSE]
+        yield [
+            updates.message(student, 'My courses'),
+            updates.callback(student, f'course_{course}'),
+            updates.message(student, 'Publications'),
+            updates.callback(student, Pagination(action='next', page=0, entity_type='publications').pack()),
+            updates.callback(student, f'publication_{publication}'),
+        ]
+
+
+def grading(updates: Updates, submissions):
+    """Teachers open a publication of their course, list the submissions and grade one"""
+    for teacher, course, publication, submission in submissions:
+        yield [
+            updates.message(teacher, 'My courses'),
+            updates.callback(teacher, f'course_{course}'),
+            updates.callback(teacher, f'publication_{publication}'),
+            updates.message(teacher, 'Submissions'),
+            updates.callback(teacher, f'submission_{submission}'),
+            updates.message(teacher, 'Grade'),
+            updates.message(teacher, '7'),
+        ]
+
+
+def join_storm(updates: Updates, users: int):
+    """Students who aren't in any course all join the first one"""
+    for student in range(TEACHERS + STUDENTS + 1, TEACHERS + STUDENTS + 1 + min(users, JOINERS)):
+        yield [updates.message(student, 'Join course'), updates.message(student, f'{KEY}1')]
+
+
+async def reset_redis():
+    """Flushes the bot's Redis databases, refusing to if one of them holds data of anything but the benchmark"""
+    databases = (redis_fsm, redis_cache, redis_queue)
+    for redis in databases:
+        if await redis.dbsize() and not await redis.exists(MARKER):
+            sys.exit(f'{redis} holds data the benchmark did not write, point BENCH-REDIS-HOST at an empty Redis')
+    for redis in databases:
+        await redis.flushdb()
+        await redis.set(MARKER, 1)
+
+
+def calls():
+    """Totals of the calls counted for all the updates handled so far"""
+    return {kind: metrics.calls_per_update.values.get((kind,), ([], [0.0]))[1][0] for kind in ('sql', 'redis', 'api')}
+
+
+async def run(dp, bot, name, flows, concurrency):
+    flows = list(flows)
+    latencies = []
+    errors = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def play(flow):
+        nonlocal errors
+        async with slots:
+            for update in flow:
+                started = time.perf_counter()
+                try:
+                    await dp.feed_update(bot, update)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+    before = calls()
+    started = time.perf_counter()
+    await asyncio.gather(*(play(flow) for flow in flows))
+    elapsed = time.perf_counter() - started
+    after = calls()
+
+    count = len(latencies)
+    quantiles = statistics.quantiles(latencies, n=100) if count > 1 else latencies * 99
+    per_update = '  '.join(f'{kind} {(after[kind] - before[kind]) / count:5.1f}' for kind in after)
+    print(f'{name:<16}{count:>7} updates {count / elapsed:>8.1f}/s  p50 {quantiles[49] * 1000:7.1f} ms  '
+          f'p99 {quantiles[98] * 1000:7.1f} ms  {per_update}  errors {errors}')
+
+
+async def main(users, concurrency, api_latency_ms):
+    await reset_redis()
+    url = os.getenv('DB-URL')
+    async with create_async_engine(url).begin() as connection:
+        await connection.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+        await connection.execute(text(f'CREATE SCHEMA {SCHEMA}'))
+        await connection.execute(text(f'SET LOCAL search_path TO {SCHEMA}'))
+        await connection.run_sync(BaseModel.metadata.create_all)
+        for stmt in SEED:
+            await connection.execute(text(stmt))
+        await connection.execute(text('ANALYZE'))
+
+    engine = create_async_engine(url, connect_args={'server_settings': {'search_path': SCHEMA}})
+    try:
+        async with engine.connect() as connection:
+            stmt = select(Courses.teacher, Courses.id, Publications.id, Submissions.id).join(
+                Publications, Publications.course_id == Courses.id).join(
+                Submissions, Submissions.publication == Publications.id).distinct(Courses.teacher).order_by(
+                Courses.teacher, Courses.id, Publications.id, Submissions.id)
+            submissions = (await connection.execute(stmt)).all()
+
+        dp = create_dispatcher(engine)
+        bot = Bot(os.environ['TOKEN'], session=FakeSession(api_latency_ms / 1000))
+        bot.session.middleware(metrics.RequestMetricsMiddleware())
+        updates = Updates(bot)
+
+        print(f'{users} users, concurrency {concurrency}, Bot API latency {api_latency_ms} ms')
+        await run(dp, bot, 'browse (cold)', browsing(updates, users), concurrency)
+        await run(dp, bot, 'browse (warm)', browsing(updates, users), concurrency)
+        await run(dp, bot, 'grading', grading(updates, submissions), concurrency)
+        await run(dp, bot, 'join storm', join_storm(updates, users), concurrency)
+    finally:
+        await engine.dispose()
+        async with create_async_engine(url).begin() as connection:
+            await connection.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+
+
+if __name__ == '__main__':
+    arguments = [int(argument) for argument in sys.argv[1:]]
+    defaults = [200, 50, 30]
+    asyncio.run(main(*(arguments + defaults[len(arguments):])))
@@ -0,0 +1,121 @@
+"""
+Before/after EXPLAIN ANALYZE report for the indexes of the query patterns in bot/db/queries.py.
+
+Seeds a throwaway `explain_bench` schema in the database from DB-URL, explains every query without the
+indexes, creates them and explains again. The schema is dropped afterwards.
+
+Run with `python -m benchmarks.explain_indexes [courses]`.
+"""
+import asyncio
+import os
+import re
+import sys
+
+from dotenv import load_dotenv
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from bot.db import BaseModel, Courses, CoursesStudents, Media, Publications, Users, Submissions
+from bot.db import pagination
+
+SCHEMA = 'explain_bench'
+STUDENTS = 2000
+PUBLICATIONS_PER_COURSE = 20
+SUBMISSIONS_PER_PUBLICATION = 30
+# the bounded load of a collection on a cache miss, MAX_PAGED_ROWS + 1 in bot/db/cache.py
+COLLECTION_LOAD_LIMIT = 501
+
+SEED = [
+    f'''INSERT INTO users (user_id, username, is_teacher, reg_date, upd_date)
+        SELECT g, 'user_' || g, g <= {{courses}}, now(), now() FROM generate_series(1, {STUDENTS}) g''',
+    '''INSERT INTO courses (id, name, key, teacher)
+       SELECT g, 'course ' || g, 'abcdef', g FROM generate_series(1, {courses}) g''',
+    f'''INSERT INTO courses_students (course_id, student_id)
+        SELECT c, s FROM generate_series(1, {{courses}}) c, generate_series(1, {STUDENTS}) s
+        WHERE (c + s) % 10 = 0''',
+    f'''INSERT INTO publications (id, title, text, course_id, add_date)
+        SELECT g, 'publication ' || g, repeat('text ', 50), (g - 1) / {PUBLICATIONS_PER_COURSE} + 1,
+               now() - g * interval '1 minute'
+        FROM generate_series(1, {{courses}} * {PUBLICATIONS_PER_COURSE}) g''',
+    f'''INSERT INTO submissions (text, publication, student, add_date, update_date)
+        SELECT 'answer', p, (p * 7 + s) % {STUDENTS} + 1, now(), now()
+        FROM generate_series(1, {{courses}} * {PUBLICATIONS_PER_COURSE}) p,
+             generate_series(1, {SUBMISSIONS_PER_PUBLICATION}) s''',
+    '''INSERT INTO media (file_id, media_type, publication)
+       SELECT 'file_' || g, 'photo', g FROM generate_series(1, {courses} * 20) g''',
+    '''INSERT INTO media (file_id, media_type, submission)
+       SELECT 'sub_file_' || g, 'document', g FROM generate_series(1, {courses} * 100) g''',
+]
+
+
+def queries(course_id, publication_id, submission_id, teacher_id, student_id):
+    """The statements queries.py runs on a cache miss"""
+    return {
+        'publications of a course': select(Publications).where(Publications.course_id == course_id).order_by(
+            *pagination.publications.order).limit(COLLECTION_LOAD_LIMIT),
+        'students of a course': select(Users).join(CoursesStudents).where(
+            CoursesStudents.course_id == course_id).order_by(*pagination.students.order),
+        'submissions of a publication': select(Submissions).where(
+            Submissions.publication == publication_id).order_by(*pagination.submissions.order),
+        'submission of a student': select(Submissions).where(Submissions.publication == publication_id,
+                                                             Submissions.student == student_id),
+        'courses of a teacher': select(Courses).where(Courses.teacher == teacher_id).order_by(
+            *pagination.courses.order),
+        'courses of a student': select(Courses).join(CoursesStudents).where(
+            CoursesStudents.student_id == student_id).order_by(*pagination.courses.order),
+        'media of a publication': select(Media).where(Media.publication == publication_id),
+        'media of a submission': select(Media).where(Media.submission == submission_id),
+    }
+
+
+def compile_sql(stmt):
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+
+
+async def explain(connection, stmt):
+    result = await connection.execute(text(f'EXPLAIN (ANALYZE, BUFFERS) {compile_sql(stmt)}'))
+    plan = [row[0] for row in result]
+    execution = next(float(re.findall(r'[\d.]+', line)[0]) for line in plan if line.startswith('Execution Time'))
+    return plan[0].strip(), execution
+
+
+async def report(connection, title, statements):
+    print(f'\n== {title}')
+    for name, stmt in statements.items():
+        top, execution = await explain(connection, stmt)
+        print(f'{name:<30}{execution:>10.3f} ms  {top}')
+
+
+async def main(courses):
+    load_dotenv()
+    engine = create_async_engine(os.getenv('DB-URL'))
+    indexes = [index for table in BaseModel.metadata.sorted_tables for index in table.indexes]
+    try:
+        async with engine.begin() as connection:
+            await connection.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+            await connection.execute(text(f'CREATE SCHEMA {SCHEMA}'))
+            await connection.execute(text(f'SET LOCAL search_path TO {SCHEMA}'))
+            await connection.run_sync(BaseModel.metadata.create_all)
+            for index in indexes:
+                await connection.execute(text(f'DROP INDEX {index.name}'))
+            for stmt in SEED:
+                await connection.execute(text(stmt.format(courses=courses)))
+            await connection.execute(text('ANALYZE'))
+
+            statements = queries(course_id=courses // 2, publication_id=courses * 10, submission_id=courses * 50,
+                                 teacher_id=courses // 2, student_id=STUDENTS // 2)
+            await report(connection, 'without indexes', statements)
+
+            for index in indexes:
+                await connection.run_sync(index.create)
+            await connection.execute(text('ANALYZE'))
+            await report(connection, 'with indexes', statements)
+    finally:
+        async with engine.begin() as connection:
+            await connection.execute(text(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE'))
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
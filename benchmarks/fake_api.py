@@ -0,0 +1,162 @@
+"""
+Local stand-in for api.telegram.org, for load and fan-out tests without touching Telegram.
+
+It answers the Bot API methods the bot uses after a log-normal latency and enforces what matters for throughput:
+about 30 messages per second per bot and about one per second per chat (token buckets with a small burst), over
+which it answers 429 with retry_after; 403 for chats that blocked the bot (`blocked_percent` of the chat ids);
+and 1 to 10 items in a media group. GET /stats returns the responses sent so far by method and status.
+
+Point the bot or the worker at it with TELEGRAM-API-URL=http://localhost:8081, or build a session with
+`session(url)`. Run with `python -m benchmarks.fake_api [port] [latency_ms] [blocked_percent]`.
+"""
+import asyncio
+import itertools
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+GLOBAL_RATE = 30
+GLOBAL_BURST = 30
+CHAT_RATE = 1
+CHAT_BURST = 3
+MEDIA_GROUP_LIMIT = 10
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, amount: float = 1) -> float:
+        """Takes the tokens, or returns how many seconds to wait for them without taking anything"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class FakeTelegram:
+    """The state of the fake server: rate limits, blocked chats and counters"""
+
+    def __init__(self, latency_ms: float = 50, blocked_percent: float = 0, bot_id: int = 123456):
+        self.latency = latency_ms / 1000
+        self.blocked_percent = blocked_percent
+        self.bot_id = bot_id
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self.chat_buckets = {}
+        self.message_ids = itertools.count(1)
+        self.stats = Counter()
+
+    def is_blocked(self, chat_id: int) -> bool:
+        return chat_id % 100 < self.blocked_percent
+
+    def message(self, chat_id, params):
+        return {'message_id': next(self.message_ids), 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text')}
+
+    def error(self, code: int, description: str, **parameters):
+        body = {'ok': False, 'error_code': code, 'description': description}
+        if parameters:
+            body['parameters'] = parameters
+        return body
+
+    def throttle(self, chat_id: int, messages: int):
+        """A 429 body when the chat bucket or the global one, where every album item counts, is empty"""
+        bucket = self.chat_buckets.setdefault(chat_id, TokenBucket(CHAT_RATE, CHAT_BURST))
+        wait = bucket.take()
+        if not wait:
+            wait = self.global_bucket.take(messages)
+            if wait:
+                # the chat didn't get its message, hand its token back
+                bucket.tokens += 1
+        if wait:
+            retry_after = math.ceil(wait)
+            return self.error(429, f'Too Many Requests: retry after {retry_after}', retry_after=retry_after)
+        return None
+
+    async def answer(self, method: str, params: dict):
+        if method == 'getMe':
+            return {'ok': True, 'result': {'id': self.bot_id, 'is_bot': True, 'first_name': 'fake'}}
+        if method == 'getUpdates':
+            await asyncio.sleep(min(float(params.get('timeout') or 0), 1))
+            return {'ok': True, 'result': []}
+        if not (method.startswith('send') or method in ('copyMessage', 'forwardMessage')):
+            # answerCallbackQuery, editMessage*, setWebhook and the like
+            return {'ok': True, 'result': True}
+
+        chat_id = int(params.get('chat_id', 0))
+        media = json.loads(params['media']) if method == 'sendMediaGroup' else [None]
+        if method == 'sendMediaGroup' and not 1 <= len(media) <= MEDIA_GROUP_LIMIT:
+            return self.error(400, 'Bad Request: too much messages to send as an album')
+        if self.is_blocked(chat_id):
+            return self.error(403, 'Forbidden: bot was blocked by the user')
+        throttled = self.throttle(chat_id, len(media))
+        if throttled:
+            return throttled
+        if method == 'sendMediaGroup':
+            return {'ok': True, 'result': [self.message(chat_id, params) for _ in media]}
+        return {'ok': True, 'result': self.message(chat_id, params)}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if self.latency:
+            await asyncio.sleep(random.lognormvariate(math.log(self.latency), 0.5))
+        body = await self.answer(method, params)
+        status = body.get('error_code', 200)
+        self.stats[f'{method} {status}'] += 1
+        return web.json_response(body, status=status)
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        app.router.add_get('/stats', self.handle_stats)
+        return app
+
+
+async def serve(telegram: FakeTelegram, port: int = 8081) -> web.AppRunner:
+    runner = web.AppRunner(telegram.app())
+    await runner.setup()
+    await web.TCPSite(runner, 'localhost', port).start()
+    return runner
+
+
+def session(url: str = 'http://localhost:8081') -> AiohttpSession:
+    """A Bot API session that talks to the fake server"""
+    return AiohttpSession(api=TelegramAPIServer.from_base(url))
+
+
+async def main(port, latency_ms, blocked_percent):
+    telegram = FakeTelegram(latency_ms, blocked_percent)
+    runner = await serve(telegram, port)
+    print(f'Fake Bot API on http://localhost:{port}, latency {latency_ms} ms, {blocked_percent}% blocked')
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print('  '.join(f'{key}: {value}' for key, value in sorted(telegram.stats.items())))
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    arguments = [int(argument) for argument in sys.argv[1:]]
+    defaults = [8081, 50, 5]
+    asyncio.run(main(*(arguments + defaults[len(arguments):])))
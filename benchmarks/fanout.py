@@ -0,0 +1,86 @@
+"""
+Notification fan-out against the fake Bot API from benchmarks/fake_api.py.
+
+Starts the fake server in process, points the bot at it and sends one message to each of `chats` chats through
+bot.broadcast.deliver with as many concurrent senders as the worker runs, then sends an album of 25 photos to a
+few chats through media_group_send. Prints the throughput, the delivery outcomes and the responses of the server,
+the 429s show how well the rate limiter keeps under Telegram's limits.
+Chats that turn out blocked are marked in the Redis from REDIS-HOST.
+
+Run with `python -m benchmarks.fanout [chats] [latency_ms] [blocked_percent]`.
+"""
+import asyncio
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+PORT = 8081
+os.environ.setdefault('TOKEN', '123456:benchmark')
+os.environ['TELEGRAM-API-URL'] = f'http://localhost:{PORT}'
+
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+from aiogram.types import InputMediaPhoto, Message  # noqa: E402
+
+from benchmarks.fake_api import FakeTelegram, serve  # noqa: E402
+from bot.__main__ import bot  # noqa: E402
+from bot.broadcast import BroadcastResult, deliver  # noqa: E402
+from bot.handlers.common.services import media_group_send  # noqa: E402
+from bot.worker import CONCURRENCY  # noqa: E402
+
+ALBUM = 25
+ALBUM_CHATS = 20
+
+
+async def fan_out(chats):
+    result = BroadcastResult()
+    queue = iter(range(1000, 1000 + chats))
+
+    async def sender():
+        for chat_id in queue:
+            status = await deliver(chat_id, 'A new publication in your course')
+            setattr(result, status, getattr(result, status) + 1)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - started
+    print(f'fan-out  {chats} chats in {elapsed:.1f} s, {chats / elapsed:.1f} messages/s, {result}')
+
+
+async def albums(telegram: FakeTelegram):
+    photos = [InputMediaPhoto(media=f'photo_{i}') for i in range(ALBUM)]
+    chats = [chat_id for chat_id in range(1, 100) if not telegram.is_blocked(chat_id)][:ALBUM_CHATS]
+    flood_waits = 0
+    started = time.perf_counter()
+    for chat_id in chats:
+        message = Message.model_validate({'message_id': 1, 'date': int(time.time()),
+                                          'chat': {'id': chat_id, 'type': 'private'}}, context={'bot': bot})
+        while True:
+            try:
+                await media_group_send(message, photos, [], [])
+                break
+            except TelegramRetryAfter as e:
+                flood_waits += 1
+                await asyncio.sleep(e.retry_after)
+    elapsed = time.perf_counter() - started
+    print(f'albums   {len(chats)} albums of {ALBUM} photos in {elapsed:.1f} s, {flood_waits} flood waits')
+
+
+async def main(chats, latency_ms, blocked_percent):
+    telegram = FakeTelegram(latency_ms, blocked_percent)
+    runner = await serve(telegram, PORT)
+    try:
+        await fan_out(chats)
+        await albums(telegram)
+        print('server   ' + '  '.join(f'{key}: {value}' for key, value in sorted(telegram.stats.items())))
+    finally:
+        await bot.session.close()
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    arguments = [int(argument) for argument in sys.argv[1:]]
+    defaults = [1000, 50, 5]
+    asyncio.run(main(*(arguments + defaults[len(arguments):])))
@@ -4,29 +4,82 @@ import os
 import sys
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.redis import RedisStorage
-from aioredis import Redis
+from aioredis import ConnectionPool, Redis
 from dotenv import load_dotenv
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-from bot.middlewares.db import DbSessionMiddleware
+from bot import metrics
 
 load_dotenv()
-bot = Bot(token=os.getenv('TOKEN'))
-redis_fsm = Redis(host='redis', port=6379)
-redis_cache = Redis(host='redis', port=6379, db=1)
+api_url = os.getenv('TELEGRAM-API-URL')  # a local Bot API server, or benchmarks/fake_api.py in load tests
+bot = Bot(token=os.getenv('TOKEN'),
+          session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)) if api_url else None)
+redis_host = os.getenv('REDIS-HOST', 'redis')
+redis_fsm = Redis(connection_pool=ConnectionPool(host=redis_host, port=6379,
+                                                  connection_class=metrics.CountingConnection))
+redis_cache = Redis(connection_pool=ConnectionPool(host=redis_host, port=6379, db=1,
+                                                   connection_class=metrics.CountingConnection))
+# the outbox, reminders and partition streams can't be rebuilt like the cache, they live in a database of their own
+redis_queue = Redis(connection_pool=ConnectionPool(host=os.getenv('REDIS-QUEUE-HOST', redis_host), port=6379,
+                                                   db=int(os.getenv('REDIS-QUEUE-DB', 2)),
+                                                   connection_class=metrics.CountingConnection))
 
 
-async def main():
+def create_dispatcher(engine) -> Dispatcher:
+    """Builds the dispatcher with its middlewares and routers, used by the bot and the end-to-end benchmark"""
     from bot.handlers.common.handlers import router
     from bot.handlers.students.handlers import router as student_router
     from bot.handlers.tutors.handlers import router as teacher_router
-    engine = create_async_engine(url=os.getenv('DB-URL'), echo=True)
+    from bot.db.cache import local
+    from bot.db import profiling
+    from bot.middlewares.db import DbSessionMiddleware
+    from bot.middlewares.role import UserRoleMiddleware
     sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+    metrics.instrument_engine(engine)
+    profiling.instrument(engine)
+    metrics.watch_cache(local)
     dp = Dispatcher(storage=RedisStorage(redis=redis_fsm))
+    metrics.instrument_dispatcher(dp)
+    dp.update.outer_middleware(profiling.QueryProfileMiddleware())
     dp.update.middleware(DbSessionMiddleware(session_pool=sessionmaker))
+    dp.update.middleware(UserRoleMiddleware())
     dp.include_routers(teacher_router, student_router, router)
-    await dp.start_polling(bot)
+    return dp
+
+
+async def main():
+    from bot.db.cache import listen_invalidations
+    from bot.webhook import WEBHOOK_URL, run_webhook
+    from bot import partitions
+    engine = create_async_engine(url=os.getenv('DB-URL'), echo=bool(os.getenv('SQL-ECHO')))
+    dp = create_dispatcher(engine)
+    bot.session.middleware(metrics.RequestMetricsMiddleware())
+    invalidations = asyncio.create_task(listen_invalidations())
+    metrics_server = await metrics.serve(int(os.getenv('METRICS-PORT'))) if os.getenv('METRICS-PORT') else None
+    try:
+        if partitions.PARTITION is not None:
+            await partitions.consume(dp, bot, int(partitions.PARTITION))
+        elif partitions.PARTITIONS:
+            # forwarding one update at a time keeps the updates of a chat in order
+            dp.update.outer_middleware(partitions.UpdateForwarder(partitions.PARTITIONS))
+            if WEBHOOK_URL:
+                # Telegram is answered only once the update is in its stream, so it is never lost
+                await run_webhook(dp, bot, concurrency=1, background=False)
+            else:
+                await bot.delete_webhook()
+                await dp.start_polling(bot, handle_as_tasks=False)
+        elif WEBHOOK_URL:
+            await run_webhook(dp, bot)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        invalidations.cancel()
+        if metrics_server:
+            await metrics_server.cleanup()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, \
+    TelegramServerError
+
+from bot.__main__ import bot, redis_queue as redis
+
+logger = logging.getLogger(__name__)
+
+# Telegram accepts about 30 messages per second from a bot and about one per second to a single chat
+GLOBAL_RATE = float(os.getenv('BROADCAST-RATE', 25))
+CHAT_INTERVAL = 1.0
+MAX_ATTEMPTS = 3
+BLOCKED_TTL = 60 * 60 * 24
+
+
+@dataclass
+class BroadcastResult:
+    """Outcome of a batch of sends"""
+    delivered: int = 0
+    failed: int = 0
+    blocked: int = 0
+    retried: int = 0
+
+
+# Reserves the next send slot to a chat: the global schedule advances by one interval and the chat's by its own,
+# returns how many seconds to wait for the slot. Times come from the Redis clock, which every worker shares.
+_TAKE_SLOT = """
+local clock = redis.call('time')
+local now = clock[1] + clock[2] / 1000000
+local slot = math.max(now, tonumber(redis.call('get', KEYS[1]) or 0))
+local next_slot = slot + tonumber(ARGV[1])
+redis.call('set', KEYS[1], tostring(next_slot), 'px', math.ceil((next_slot - now) * 1000) + 1000)
+local at = math.max(slot, tonumber(redis.call('get', KEYS[2]) or 0))
+local chat_free = at + tonumber(ARGV[2])
+redis.call('set', KEYS[2], tostring(chat_free), 'px', math.ceil((chat_free - now) * 1000) + 1000)
+return tostring(at - now)
+"""
+
+# Pushes the global schedule back to at least ARGV[1] seconds from now
+_PAUSE = """
+local clock = redis.call('time')
+local resume = clock[1] + clock[2] / 1000000 + tonumber(ARGV[1])
+if resume > tonumber(redis.call('get', KEYS[1]) or 0) then
+    redis.call('set', KEYS[1], tostring(resume), 'px', math.ceil(tonumber(ARGV[1]) * 1000) + 1000)
+end
+return 0
+"""
+
+
+class RateLimiter:
+    """
+    Hands out send slots spaced by the global rate and by the per-chat interval.
+    The schedule is kept in Redis, so the limits hold across every worker process,
+    and a flood wait reported to any of them pushes every following slot back.
+    """
+
+    def __init__(self, rate: float, chat_interval: float, prefix: str = 'ratelimit'):
+        self.interval = 1 / rate
+        self.chat_interval = chat_interval
+        self.prefix = prefix
+
+    async def wait(self, chat_id):
+        delay = float(await redis.eval(_TAKE_SLOT, 2, f'{self.prefix}:next', f'{self.prefix}:chat:{chat_id}',
+                                       self.interval, self.chat_interval))
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def pause(self, seconds: float):
+        await redis.eval(_PAUSE, 1, f'{self.prefix}:next', seconds)
+
+
+limiter = RateLimiter(GLOBAL_RATE, CHAT_INTERVAL)
+
+
+async def deliver(chat_id: int, text: str, **kwargs) -> str:
+    """
+    Sends one message within the rate limits, waiting out flood waits.
+
+    Returns:
+        str: 'delivered', 'blocked' if the user blocked the bot, 'failed' if Telegram rejected the message,
+        or 'retried' if it may go through later (network or server errors, repeated flood waits).
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        await limiter.wait(chat_id)
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            return 'delivered'
+        except TelegramRetryAfter as e:
+            logger.warning('Flood wait of %ss while sending to %s', e.retry_after, chat_id)
+            await limiter.pause(e.retry_after)
+        except TelegramForbiddenError:
+            # the user blocked the bot, later notifications skip the chat for a while
+            await redis.set(f'blocked:{chat_id}', 1, ex=BLOCKED_TTL)
+            return 'blocked'
+        except (TelegramNetworkError, TelegramServerError) as e:
+            logger.warning('Sending to %s will be retried: %s', chat_id, e)
+            return 'retried'
+        except TelegramAPIError as e:
+            logger.warning('Could not send a message to %s: %s', chat_id, e)
+            return 'failed'
+    return 'retried'
@@ -0,0 +1,454 @@
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from uuid import uuid4
+
+from aioredis.exceptions import ResponseError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.__main__ import redis_cache as redis
+from bot.db import codec
+from bot.db.local_cache import LocalCache
+
+WEEK = 604800
+LEASE_MS = 3000
+LEASE_POLL = 0.05
+
+_RELEASE_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+INVALIDATION_CHANNEL = 'cache:invalidate'
+LIST_HEADER = b'#'
+OVERFLOW_HEADER = b'+'
+MAX_PAGED_ROWS = 500
+
+_FAILED = object()
+_MISSING = object()
+_inflight: dict[str, asyncio.Future] = {}
+
+_collector: ContextVar = ContextVar('cache_invalidation_collector', default=None)
+
+local = LocalCache(maxsize=int(os.getenv('CACHE-L1-SIZE', 10000)), ttl=float(os.getenv('CACHE-L1-TTL', 60)))
+
+
+class CacheEntity:
+    """
+    Describes how one kind of cached value is keyed, encoded and expired.
+    Collections are kept as Redis lists of encoded rows behind a header element, so pages can be read by range.
+    Collections too large to cache for paging keep only an overflow header and are paged in SQL instead.
+    """
+
+    def __init__(self, prefix, schema: codec.Schema, many=False, ttl=WEEK):
+        self.prefix = prefix
+        self.codec = schema
+        self.many = many
+        self.ttl = ttl
+
+    def key(self, ident):
+        return f'{self.prefix}:{ident}'
+
+    def encode(self, value):
+        if self.many:
+            return [self.codec.encode(obj) for obj in value]
+        return self.codec.encode(value)
+
+    def decode(self, raw):
+        if self.many:
+            return [self.codec.decode(item) for item in raw]
+        return self.codec.decode(raw)
+
+    def write(self, pipe, key, encoded):
+        """Queues the commands storing an encoded value (None for an overflowed collection) on a pipeline"""
+        if self.many:
+            pipe.delete(key)
+            if encoded is None:
+                pipe.rpush(key, OVERFLOW_HEADER)
+            else:
+                pipe.rpush(key, LIST_HEADER, *encoded)
+            pipe.expire(key, self.ttl)
+        else:
+            pipe.set(key, encoded, ex=self.ttl)
+
+
+user = CacheEntity('user', codec.users)
+course = CacheEntity('course', codec.courses)
+publication = CacheEntity('publication', codec.publications)
+submission = CacheEntity('submission', codec.submissions)
+courses_teacher = CacheEntity('courses_teacher', codec.courses, many=True)
+courses_student = CacheEntity('courses_student', codec.courses, many=True)
+students_course = CacheEntity('students_course', codec.users, many=True)
+publications_course = CacheEntity('publications_course', codec.publications, many=True)
+submissions_publication = CacheEntity('submissions_publication', codec.submissions, many=True)
+medias_publication = CacheEntity('medias_publication', codec.media, many=True)
+medias_submission = CacheEntity('medias_submission', codec.media, many=True)
+
+
+async def _read(entity: CacheEntity, key):
+    """
+    Returns the encoded value stored under the key, None if it is missing or in an outdated format
+    or OVERFLOW_HEADER for a collection too large to be cached.
+    """
+    try:
+        if entity.many:
+            items = await redis.lrange(key, 0, -1)
+            if items and items[0] == OVERFLOW_HEADER:
+                return OVERFLOW_HEADER
+            return items[1:] if items and items[0] == LIST_HEADER else None
+        cached = await redis.get(key)
+    except ResponseError:
+        # the key still holds a value of another type written by an older version
+        return None
+    return cached if cached is not None and codec.is_encoded(cached) else None
+
+
+async def _read_range(entity: CacheEntity, key, start, count):
+    """
+    Returns encoded rows [start, start + count) of a cached collection, None if it is not cached
+    or OVERFLOW_HEADER if it is too large to be paged from the cache.
+    """
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.lindex(key, 0)
+        pipe.lrange(key, start + 1, start + count)
+        try:
+            header, items = await pipe.execute()
+        except ResponseError:
+            return None
+    if header == OVERFLOW_HEADER:
+        return OVERFLOW_HEADER
+    return items if header == LIST_HEADER else None
+
+
+async def _query(session: AsyncSession, entity: CacheEntity, stmt):
+    """Loads the value from the database as views, without touching the cache"""
+    result = await session.execute(stmt)
+    if entity.many:
+        return [entity.codec.view_of(obj) for obj in result.scalars()]
+    obj = result.scalar()
+    return entity.codec.view_of(obj) if obj is not None else None
+
+
+def _pending(key) -> bool:
+    """
+    Whether the open unit of work invalidated the key: the cached value is outdated for it until the commit,
+    and what it loads mustn't be cached before then.
+    """
+    collector = _collector.get()
+    return collector is not None and key in collector.keys
+
+
+async def _wait_for_lease(entity: CacheEntity, key, lease):
+    """
+    Polls the key while another instance holds its lease.
+    Returns the cached value (OVERFLOW_HEADER for an overflowed collection), or None if the lease was released
+    without a value or timed out.
+    """
+    for _ in range(int(LEASE_MS / 1000 / LEASE_POLL)):
+        await asyncio.sleep(LEASE_POLL)
+        cached = await _read(entity, key)
+        if cached is not None:
+            return cached
+        if not await redis.exists(lease):
+            return None
+    return None
+
+
+async def _rebuild(session: AsyncSession, entity: CacheEntity, key, stmt, max_rows=None):
+    """
+    Loads the value from the database under a short Redis lease, so only one instance runs the query.
+    Returns the loaded value and its encoded form (None for a missing single entity).
+    With max_rows a collection is loaded only if it is not larger, otherwise it is marked as overflowed
+    and (None, None) is returned.
+    """
+    lease = f'lock:{key}'
+    token = uuid4().hex
+    if not await redis.set(lease, token, nx=True, px=LEASE_MS):
+        cached = await _wait_for_lease(entity, key, lease)
+        if cached is OVERFLOW_HEADER:
+            return None, None
+        if cached is not None:
+            return entity.decode(cached), cached
+        token = None
+
+    if max_rows:
+        stmt = stmt.limit(max_rows + 1)
+    value = await _query(session, entity, stmt)
+    if max_rows and len(value) > max_rows:
+        value = None
+    encoded = entity.encode(value) if value is not None else None
+
+    async with redis.pipeline(transaction=True) as pipe:
+        if entity.many or encoded is not None:
+            entity.write(pipe, key, encoded)
+        if token:
+            pipe.eval(_RELEASE_LEASE, 1, lease, token)
+        await pipe.execute()
+    return value, encoded
+
+
+async def _load(session: AsyncSession, entity: CacheEntity, key, stmt, max_rows=None):
+    """Coalesces concurrent misses of one key: the first coroutine rebuilds it, the rest decode its result"""
+    flight_key = f'{key}#{max_rows}' if max_rows else key
+    flight = _inflight.get(flight_key)
+    if flight is not None:
+        encoded = await asyncio.shield(flight)
+        if encoded is not _FAILED:
+            return entity.decode(encoded) if encoded is not None else None
+
+    flight = asyncio.get_running_loop().create_future()
+    _inflight[flight_key] = flight
+    try:
+        value, encoded = await _rebuild(session, entity, key, stmt, max_rows)
+    except BaseException:
+        flight.set_result(_FAILED)
+        raise
+    else:
+        flight.set_result(encoded)
+    finally:
+        if _inflight.get(flight_key) is flight:
+            del _inflight[flight_key]
+    return value
+
+
+async def fetch(session: AsyncSession, entity: CacheEntity, ident, stmt, limit: int = None, offset: int = 0,
+                seek=None):
+    """
+    Reads a value through the cache tiers: the in-process LRU first, then Redis, and finally the database,
+    loaded once per key across concurrent callers. A limit on a collection reads only that slice of rows.
+    Collections larger than MAX_PAGED_ROWS aren't cached and are always read from the database.
+    Keys the current unit of work invalidated are read from its own session, so it sees its writes.
+    """
+    if limit and entity.many:
+        return await fetch_page(session, entity, ident, stmt, offset, limit, seek)
+
+    key = entity.key(ident)
+    if _pending(key):
+        return await _query(session, entity, stmt)
+    value = local.get(key, _MISSING)
+    if value is _MISSING:
+        generation = local.generation
+        cached = await _read(entity, key)
+        if cached is OVERFLOW_HEADER:
+            return await _query(session, entity, stmt)
+        if cached is not None:
+            value = entity.decode(cached)
+        else:
+            value = await _load(session, entity, key, stmt, MAX_PAGED_ROWS if entity.many else None)
+            if value is None and entity.many:
+                return await _query(session, entity, stmt)
+        if value is not None:
+            local.set(key, value, generation)
+    return value
+
+
+async def fetch_many(session: AsyncSession, entity: CacheEntity, idents, stmt_for, ident_field):
+    """
+    Reads the single values of many keys at once: the in-process LRU first, one MGET for the rest and one query,
+    built by stmt_for from the idents still missing, whose rows are written back in one pipeline.
+    Returns the values by ident, idents without a row are left out.
+    """
+    values = {}
+    missing, uncached = [], []
+    for ident in dict.fromkeys(idents):
+        if _pending(entity.key(ident)):
+            uncached.append(ident)
+            continue
+        value = local.get(entity.key(ident), _MISSING)
+        if value is _MISSING:
+            missing.append(ident)
+        else:
+            values[ident] = value
+
+    generation = local.generation
+    if missing:
+        for ident, cached in zip(missing, await redis.mget([entity.key(ident) for ident in missing])):
+            if cached is not None and codec.is_encoded(cached):
+                values[ident] = entity.decode(cached)
+                local.set(entity.key(ident), values[ident], generation)
+            else:
+                uncached.append(ident)
+
+    if uncached:
+        result = await session.execute(stmt_for(uncached))
+        loaded = [entity.codec.view_of(obj) for obj in result.scalars()]
+        async with redis.pipeline(transaction=False) as pipe:
+            for value in loaded:
+                ident = getattr(value, ident_field)
+                values[ident] = value
+                key = entity.key(ident)
+                if not _pending(key):
+                    entity.write(pipe, key, entity.encode(value))
+                    local.set(key, value, generation)
+            await pipe.execute()
+    return values
+
+
+async def fetch_page(session: AsyncSession, entity: CacheEntity, ident, stmt, start, count, seek=None):
+    """
+    Reads rows [start, start + count) of a collection. Only those rows are fetched from Redis and decoded.
+    On a miss the collection is loaded and cached if it has at most MAX_PAGED_ROWS rows; larger ones are
+    paged in the database by the seek coroutine function, which returns just the requested rows.
+    """
+    key = entity.key(ident)
+    if _pending(key):
+        if seek:
+            return [entity.codec.view_of(obj) for obj in await seek()]
+        return (await _query(session, entity, stmt))[start:start + count]
+    value = local.get(key, _MISSING)
+    if value is not _MISSING:
+        return value[start:start + count]
+
+    cached = await _read_range(entity, key, start, count)
+    if cached is OVERFLOW_HEADER:
+        value = None
+    elif cached is not None:
+        return entity.decode(cached)
+    else:
+        generation = local.generation
+        value = await _load(session, entity, key, stmt, MAX_PAGED_ROWS if seek else None)
+        if value is not None:
+            local.set(key, value, generation)
+
+    if value is None:
+        if seek:
+            return [entity.codec.view_of(obj) for obj in await seek()]
+        return (await _query(session, entity, stmt))[start:start + count]
+    return value[start:start + count]
+
+
+class InvalidationCollector:
+    """
+    Gathers the keys invalidated by one unit of work so they can be dropped in a single round trip,
+    along with the values it primed to be written in their place and the writes deferred until its commit.
+    """
+
+    def __init__(self):
+        self.keys = set()
+        self.primed = {}
+        self.deferred = []
+
+    def add(self, *keys):
+        self.keys.update(keys)
+        for key in keys:
+            self.primed.pop(key, None)
+
+    def prime(self, key, entity: CacheEntity, encoded):
+        self.keys.add(key)
+        self.primed[key] = (entity, encoded)
+
+    def defer(self, func, args):
+        self.deferred.append((func, args))
+
+    async def flush(self):
+        keys, self.keys = self.keys, set()
+        primed, self.primed = self.primed, {}
+        deferred, self.deferred = self.deferred, []
+        await _unlink(keys, primed)
+        for func, args in deferred:
+            try:
+                await func(*args)
+            except Exception:
+                logging.exception('Deferred %s failed after the commit', func.__qualname__)
+
+
+@asynccontextmanager
+async def collect_invalidations():
+    """
+    Defers invalidate(), prime() and after_commit() calls made inside the block and flushes them together when
+    it exits. Nested blocks join the outer one, so the keys are flushed once, after the outermost commit.
+    If the block raises, the keys are still invalidated but the primed values and deferred writes are dropped.
+    """
+    collector = _collector.get()
+    if collector is not None:
+        yield collector
+        return
+
+    collector = InvalidationCollector()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    except BaseException:
+        collector.primed.clear()
+        collector.deferred.clear()
+        raise
+    finally:
+        _collector.reset(token)
+        await collector.flush()
+
+
+async def _unlink(keys, primed=None):
+    if not keys:
+        return
+    keys = list(keys)
+    local.discard(*keys)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.unlink(*keys)
+        for key, (entity, encoded) in (primed or {}).items():
+            entity.write(pipe, key, encoded)
+        pipe.publish(INVALIDATION_CHANNEL, json.dumps(keys))
+        await pipe.execute()
+
+
+async def invalidate(*keys):
+    """
+    Deletes keys from Redis and tells every bot instance to drop its in-process copy.
+    Inside collect_invalidations() the keys are only queued until the block exits.
+    """
+    collector = _collector.get()
+    if collector is not None:
+        collector.add(*keys)
+    else:
+        await _unlink(keys)
+
+
+async def prime(entity: CacheEntity, ident, value):
+    """
+    Caches a value just written to the database, so the next read doesn't have to load it back.
+    Inside collect_invalidations() it is stored with the invalidations after the commit.
+    """
+    key = entity.key(ident)
+    encoded = entity.encode(value)
+    collector = _collector.get()
+    if collector is not None:
+        collector.prime(key, entity, encoded)
+    else:
+        await _unlink([key], {key: (entity, encoded)})
+
+
+async def after_commit(func, *args):
+    """
+    Runs a coroutine function writing to Redis what must only happen if the changes of the unit of work are
+    committed, such as notifications about them. Inside collect_invalidations() it is called after the block
+    exits without an error, otherwise right away.
+    """
+    collector = _collector.get()
+    if collector is not None:
+        collector.defer(func, args)
+    else:
+        await func(*args)
+
+
+async def listen_invalidations():
+    """Evicts keys changed by other instances from the in-process cache, reconnecting if the subscription drops"""
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # anything published while we were disconnected is lost, so start from scratch
+            local.clear()
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    local.discard(*json.loads(message['data']))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logging.warning('Cache invalidation listener failed: %s', exc)
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.close()
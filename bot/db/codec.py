@@ -0,0 +1,61 @@
+import zlib
+from dataclasses import fields
+from datetime import datetime, timezone
+
+import msgpack
+
+from bot.db.views import CourseView, MediaView, PublicationView, SubmissionView, UserView
+
+PLAIN = b'\x00'
+COMPRESSED = b'\x01'
+COMPRESS_THRESHOLD = 1024
+
+
+def is_encoded(raw):
+    """Tells values written by this codec apart from older cache entries in another format"""
+    return raw[:1] in (PLAIN, COMPRESSED)
+
+
+class Schema:
+    """
+    Field list of one read model. Rows are packed with msgpack as positional arrays in the order the view
+    declares them, datetimes travel as native msgpack timestamps and large payloads are zlib-compressed.
+    """
+
+    def __init__(self, view):
+        self.view = view
+        self.fields = tuple(field.name for field in fields(view))
+
+    def view_of(self, obj):
+        """Copies a loaded ORM instance into the read model"""
+        return self.view(*(getattr(obj, field) for field in self.fields))
+
+    def pack_row(self, obj):
+        row = []
+        for field in self.fields:
+            value = getattr(obj, field)
+            if isinstance(value, datetime) and value.tzinfo is None:
+                # the database stores naive datetimes, msgpack timestamps need an offset to be encoded
+                value = value.replace(tzinfo=timezone.utc)
+            row.append(value)
+        return row
+
+    def unpack_row(self, row):
+        return self.view(*(value.replace(tzinfo=None) if isinstance(value, datetime) else value for value in row))
+
+    def encode(self, obj):
+        payload = msgpack.packb(self.pack_row(obj), datetime=True)
+        if len(payload) > COMPRESS_THRESHOLD:
+            return COMPRESSED + zlib.compress(payload, 1)
+        return PLAIN + payload
+
+    def decode(self, raw):
+        payload = zlib.decompress(raw[1:]) if raw[:1] == COMPRESSED else raw[1:]
+        return self.unpack_row(msgpack.unpackb(payload, timestamp=3))
+
+
+users = Schema(UserView)
+courses = Schema(CourseView)
+publications = Schema(PublicationView)
+submissions = Schema(SubmissionView)
+media = Schema(MediaView)
@@ -1,7 +1,7 @@
 import random
 from datetime import datetime
 
-from sqlalchemy import Column, String, Integer, ForeignKey, Text, DateTime, BigInteger
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, DateTime, BigInteger, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from bot.db.base import BaseModel
@@ -23,6 +23,10 @@ class Courses(BaseModel):
     teacher = Column(BigInteger, ForeignKey('users.user_id'))
     students = relationship('CoursesStudents', backref='courses')
 
+    __table_args__ = (
+        Index('ix_courses_teacher_id', teacher, id),
+    )
+
 
 class Publications(BaseModel):
     __tablename__ = 'publications'  # noqa
@@ -30,29 +34,46 @@ class Publications(BaseModel):
     id = Column(Integer, unique=True, nullable=False, primary_key=True, autoincrement=True)
     title = Column(String(60), nullable=False)
     text = Column(Text, nullable=True)
-    course_id = Column(Integer, ForeignKey('courses.id'))
+    course_id = Column(Integer, ForeignKey('courses.id', ondelete='CASCADE'))
     max_grade = Column(Integer, nullable=True)
     add_date = Column(DateTime(), default=datetime.now())
     finish_date = Column(DateTime(), default=None, nullable=True)
 
+    __table_args__ = (
+        Index('ix_publications_course_id_add_date_id', course_id, add_date.desc(), id.desc()),
+        Index('ix_publications_finish_date', finish_date, postgresql_where=finish_date.isnot(None)),
+    )
+
 
 class Submissions(BaseModel):
     __tablename__ = 'submissions'  # noqa
 
     id = Column(Integer, unique=True, nullable=False, primary_key=True, autoincrement=True)
     text = Column(Text, nullable=True)
-    publication = Column(Integer, ForeignKey('publications.id'))
+    publication = Column(Integer, ForeignKey('publications.id', ondelete='CASCADE'))
     student = Column(BigInteger, ForeignKey('users.user_id'))
     grade = Column(Integer, nullable=True)
     add_date = Column(DateTime(), default=datetime.now())
     update_date = Column(DateTime(), default=datetime.now(), onupdate=datetime.now())
 
+    __table_args__ = (
+        Index('ix_submissions_publication_add_date_id', publication, add_date, id),
+        Index('ix_submissions_publication_student', publication, student),
+    )
+
 
 class Media(BaseModel):
     __tablename__ = 'media'  # noqa
 
     id = Column(Integer, unique=True, nullable=False, primary_key=True, autoincrement=True)
-    file_id = Column(String(120), unique=True, primary_key=True, nullable=False, autoincrement=False)
+    file_id = Column(String(120), primary_key=True, nullable=False, autoincrement=False)
     media_type = Column(String(30), nullable=False)
-    publication = Column(Integer, ForeignKey('publications.id'), nullable=True)
-    submission = Column(Integer, ForeignKey('submissions.id'), nullable=True)
+    publication = Column(Integer, ForeignKey('publications.id', ondelete='CASCADE'), nullable=True)
+    submission = Column(Integer, ForeignKey('submissions.id', ondelete='CASCADE'), nullable=True)
+
+    __table_args__ = (
+        Index('ix_media_publication', publication),
+        Index('ix_media_submission', submission),
+        UniqueConstraint(file_id, publication, name='uq_media_file_id_publication'),
+        UniqueConstraint(file_id, submission, name='uq_media_file_id_submission'),
+    )
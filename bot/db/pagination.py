@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from bot.db import Courses, Publications, Users, Submissions
+
+CURSOR_DATETIME = '%Y%m%d%H%M%S%f'
+
+
+class Keyset:
+    """
+    Seek pagination over a unique, ordered set of columns. The position of a record is packed into a short
+    cursor string, small enough to travel in inline keyboard callback data.
+    """
+
+    def __init__(self, *columns, descending=False):
+        self.columns = columns
+        self.descending = descending
+
+    @property
+    def order(self):
+        return [column.desc() if self.descending else column.asc() for column in self.columns]
+
+    def cursor(self, record):
+        """Packs the ordering values of a record"""
+        values = []
+        for column in self.columns:
+            value = getattr(record, column.key)
+            values.append(value.strftime(CURSOR_DATETIME) if isinstance(value, datetime) else str(value))
+        return '_'.join(values)
+
+    def parse(self, cursor):
+        values = []
+        for column, value in zip(self.columns, cursor.split('_')):
+            if column.type.python_type is datetime:
+                values.append(datetime.strptime(value, CURSOR_DATETIME))
+            else:
+                values.append(column.type.python_type(value))
+        return values
+
+    async def fetch(self, session, stmt, limit, after=None, before=None):
+        """Runs the statement for one page of rows after or before the cursor, returned in display order"""
+        backwards = before is not None
+        cursor = before if backwards else after
+        if cursor:
+            position = tuple_(*self.columns)
+            values = tuple_(*self.parse(cursor))
+            stmt = stmt.where(position < values if self.descending != backwards else position > values)
+        if backwards:
+            order = [column.asc() if self.descending else column.desc() for column in self.columns]
+        else:
+            order = self.order
+        stmt = stmt.order_by(None).order_by(*order).limit(limit)
+
+        result = await session.execute(stmt)
+        rows = result.scalars().all()
+        return rows[::-1] if backwards else rows
+
+
+publications = Keyset(Publications.add_date, Publications.id, descending=True)
+submissions = Keyset(Submissions.add_date, Submissions.id)
+students = Keyset(Users.user_id)
+courses = Keyset(Courses.id)
+keysets = {'publications': publications, 'submissions': submissions, 'students': students, 'courses': courses}
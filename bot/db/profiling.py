@@ -0,0 +1,102 @@
+"""
+Query profiling on top of the per-update stats of bot.metrics.
+
+Statements slower than SQL-SLOW-MS are logged with their parameters, and an update that runs more than
+SQL-QUERY-BUDGET statements, or the same statement SQL-REPEAT-LIMIT times (the usual N+1 pattern), is reported
+with the handler that ran it. Use `query_budget` to hold a handler to a number of queries in a test.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import event
+
+from bot.metrics import UpdateStats, current
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv('SQL-SLOW-MS', 200))
+QUERY_BUDGET = int(os.getenv('SQL-QUERY-BUDGET', 20))
+REPEAT_LIMIT = int(os.getenv('SQL-REPEAT-LIMIT', 5))
+
+
+def _where(stats):
+    if stats is None:
+        return 'outside of an update'
+    return f'{stats.update_type or "update"} in {stats.handler or "no handler"}'
+
+
+def instrument(engine):
+    """Times every statement of an async engine and records it in the stats of the current update"""
+
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+        stats = current.get()
+        if stats is not None:
+            stats.statements[statement] = stats.statements.get(statement, 0) + 1
+        if elapsed > SLOW_QUERY_MS:
+            logger.warning('Slow query, %.0f ms, %s:\n%s\nparameters: %r', elapsed, _where(stats), statement, parameters)
+
+    @event.listens_for(engine.sync_engine, 'handle_error')
+    def handle_error(context):
+        # a failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.connection.info.get('query_started'):
+            context.connection.info['query_started'].pop()
+
+
+def check(stats: UpdateStats):
+    """Reports an update that went over the query budget or repeated a statement"""
+    total = sum(stats.statements.values())
+    if total > QUERY_BUDGET:
+        logger.warning('%s ran %d queries, the budget is %d', _where(stats), total, QUERY_BUDGET)
+    for statement, times in stats.statements.items():
+        if times >= REPEAT_LIMIT:
+            logger.warning('Possible N+1, %s ran the same query %d times:\n%s', _where(stats), times, statement)
+
+
+class QueryProfileMiddleware(BaseMiddleware):
+    """Outer update middleware, checks the queries of every update once it has been handled"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        stats = current.get()
+        token = current.set(UpdateStats(update_type=event.event_type)) if stats is None else None
+        try:
+            return await handler(event, data)
+        finally:
+            check(current.get())
+            if token:
+                current.reset(token)
+
+
+@contextmanager
+def query_budget(limit: int):
+    """
+    Fails with AssertionError if the code in the block runs more than `limit` statements, e.g.
+
+        with query_budget(2):
+            await single_publication(message, session, state)
+    """
+    stats = UpdateStats()
+    token = current.set(stats)
+    try:
+        yield stats
+    finally:
+        current.reset(token)
+    total = sum(stats.statements.values())
+    if total > limit:
+        statements = '\n'.join(f'{times} x {statement}' for statement, times in stats.statements.items())
+        raise AssertionError(f'{total} queries, the budget is {limit}:\n{statements}')
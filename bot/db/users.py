@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, String, DateTime, BigInteger, Boolean, Integer, ForeignKey
+from sqlalchemy import Column, String, DateTime, BigInteger, Boolean, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from bot.db.base import BaseModel
@@ -9,9 +9,13 @@ from bot.db.base import BaseModel
 class CoursesStudents(BaseModel):
     __tablename__ = 'courses_students'  # noqa
     id = Column(Integer, unique=True, nullable=False, primary_key=True, autoincrement=True)
-    course_id = Column(BigInteger, ForeignKey('courses.id'))
+    course_id = Column(BigInteger, ForeignKey('courses.id', ondelete='CASCADE'))
     student_id = Column(BigInteger, ForeignKey('users.user_id'), index=True)
 
+    __table_args__ = (
+        Index('ix_courses_students_course_id_student_id', course_id, student_id),
+    )
+
 
 class Users(BaseModel):
     __tablename__ = 'users'  # noqa
@@ -23,6 +27,7 @@ class Users(BaseModel):
     is_teacher = Column(Boolean, default=False)
     reg_date = Column(DateTime(), default=datetime.now())
     upd_date = Column(DateTime(), default=datetime.now(), onupdate=datetime.now())
+    daily_digest = Column(Boolean, default=False, server_default='false')  # course updates once a day
     courses = relationship('CoursesStudents', backref='students')
 
     def __str__(self):
@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+
+@dataclass(frozen=True, slots=True)
+class UserView:
+    """Read-only copy of a Users row, returned by the cached query helpers"""
+    user_id: int
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+    second_name: Optional[str] = None
+    is_teacher: bool = False
+    reg_date: Optional[datetime] = None
+    upd_date: Optional[datetime] = None
+    daily_digest: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class CourseView:
+    """Read-only copy of a Courses row, returned by the cached query helpers"""
+    id: int
+    name: str
+    key: Optional[str] = None
+    teacher: Optional[int] = None
+
+
+@dataclass(frozen=True, slots=True)
+class PublicationView:
+    """Read-only copy of a Publications row, returned by the cached query helpers"""
+    id: int
+    title: str
+    text: Optional[str] = None
+    course_id: Optional[int] = None
+    max_grade: Optional[int] = None
+    add_date: Optional[datetime] = None
+    finish_date: Optional[datetime] = None
+
+
+@dataclass(frozen=True, slots=True)
+class SubmissionView:
+    """Read-only copy of a Submissions row, returned by the cached query helpers"""
+    id: int
+    text: Optional[str] = None
+    publication: Optional[int] = None
+    student: Optional[int] = None
+    grade: Optional[int] = None
+    add_date: Optional[datetime] = None
+    update_date: Optional[datetime] = None
+
+
+@dataclass(frozen=True, slots=True)
+class MediaView:
+    """Read-only copy of a Media row, returned by the cached query helpers"""
+    id: int
+    file_id: str
+    media_type: str
+    publication: Optional[int] = None
+    submission: Optional[int] = None
@@ -4,24 +4,24 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.handlers.common import keyboards as kb
-from bot.db.queries import create_user, get_user
+from bot.db.queries import create_user, get_user, toggle_daily_digest
+from bot.db.views import UserView
 
 router = Router()
 
 
 @router.message(Command('start'))
-async def cmd_start(message: Message, session: AsyncSession):
+async def cmd_start(message: Message, user: UserView = None):
     """
     Handles the '/start' command and welcomes the user or asks for their role.
 
     Args:
         message (Message): The message containing the command.
-        session (AsyncSession): The database session.
+        user (UserView): The user who sent the message, if registered.
 
     Returns:
         None
     """
-    user = await get_user(session, message.from_user.id)
     if user:
         await message.answer('Home page', reply_markup=kb.main)
     else:
@@ -66,7 +66,6 @@ async def give_role(callback: CallbackQuery, session: AsyncSession):
             await create_user(session, callback, is_teacher=True)
             await callback.answer('Ok, I get it, you are a teacher')
             await callback.message.answer('Now choose one option below', reply_markup=kb.main)
-        await session.commit()
 
 
 @router.message(Command('cancel'))
@@ -88,6 +87,28 @@ async def cmd_cancel(message: Message, state: FSMContext):
         reply_markup=kb.main)
 
 
+@router.message(Command('digest'))
+async def cmd_digest(message: Message, session: AsyncSession, user: UserView = None):
+    """
+    Handles the '/digest' command and switches between instant course notifications and a daily digest.
+
+    Args:
+        message (Message): The message containing the command.
+        session (AsyncSession): The database session.
+        user (UserView): The user who sent the message, if registered.
+
+    Returns:
+        None
+    """
+    if not user:
+        await message.answer('Choose your role first, send /start', reply_markup=kb.main)
+        return
+    if await toggle_daily_digest(session, user.user_id):
+        await message.answer('Course updates will now come once a day', reply_markup=kb.main)
+    else:
+        await message.answer('Course updates will now come as they happen', reply_markup=kb.main)
+
+
 @router.message()
 async def echo(message: Message):
     """
@@ -1,5 +1,6 @@
 from contextlib import suppress
 from datetime import datetime
+from typing import Optional
 from aiogram.enums import ContentType
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters.callback_data import CallbackData
@@ -9,9 +10,12 @@ from aiogram.types import Message, InlineKeyboardButton, CallbackQuery, InputMed
     InputMediaAudio, InputMediaDocument
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy.ext.asyncio import AsyncSession
-from bot.db.queries import get_user, get_publications, get_course_by_id, get_single_publication, \
+from bot.db import pagination
+from bot.db.queries import get_users_many, get_publications, get_course_by_id, get_single_publication, \
     get_single_submission_by_student_and_publication, get_media
 
+PAGE_SIZE = 5
+
 
 def format_datetime(dt):
     """
@@ -54,60 +58,71 @@ async def student_name_builder(student):
     return student_name
 
 
-async def submission_name_builder(session, student_id):
+async def submission_names(session, submissions):
     """
-    Builds a submission name using the user ID.
+    Builds the names of the students who made the submissions, looking all of them up at once.
 
     Args:
         session: The database session.
-        student_id: The user ID.
+        submissions: The submissions.
 
     Returns:
-        str: The formatted submission name.
+        list: The formatted student names, in the order of the submissions.
     """
-    user = await get_user(session, student_id)
-    return await student_name_builder(user)
+    users = await get_users_many(session, [submission.student for submission in submissions])
+    return [await student_name_builder(users[submission.student]) for submission in submissions]
 
 
 class Pagination(CallbackData, prefix='pag'):
     """
     CallbackData class for pagination in inline keyboards.
+    The cursor is the keyset position of the first (for 'prev') or last (for 'next') record on the page.
     """
     action: str
     page: int
     entity_type: str
+    cursor: Optional[str] = None
 
 
-def paginator(page: int = 0, entity_type: str = 'publications'):
+def paginator(page: int = 0, entity_type: str = 'publications', records=None):
     """
     Creates a pagination inline keyboard.
 
     Args:
         page (int): The current page number.
         entity_type (str): Type of entity for pagination.
+        records: The records shown on the current page.
 
     Returns:
         InlineKeyboardBuilder: The built pagination inline keyboard.
     """
+    first = last = None
+    if records:
+        keyset = pagination.keysets[entity_type]
+        first, last = keyset.cursor(records[0]), keyset.cursor(records[-1])
+
     builder = InlineKeyboardBuilder()
     builder.row(
         InlineKeyboardButton(text='⬅',
-                             callback_data=Pagination(action='prev', page=page, entity_type=entity_type).pack()),
+                             callback_data=Pagination(action='prev', page=page, entity_type=entity_type,
+                                                      cursor=first).pack()),
         InlineKeyboardButton(text='➡',
-                             callback_data=Pagination(action='next', page=page, entity_type=entity_type).pack()),
+                             callback_data=Pagination(action='next', page=page, entity_type=entity_type,
+                                                      cursor=last).pack()),
         width=2
     )
     return builder
 
 
-async def pagination_handler(query: CallbackQuery, callback_data: Pagination, records, session=None):
+async def pagination_handler(query: CallbackQuery, callback_data: Pagination, fetch_records, session=None):
     """
     Handles pagination in response to inline keyboard button clicks.
 
     Args:
         query (CallbackQuery): The callback query.
         callback_data (Pagination): The callback data.
-        records: The records to paginate.
+        fetch_records: Coroutine function returning the records for the given limit and offset,
+            after or before the given cursor.
         session: The database session.
 
     Returns:
@@ -116,39 +131,37 @@ async def pagination_handler(query: CallbackQuery, callback_data: Pagination, re
     page_num = int(callback_data.page)
 
     if callback_data.action == 'next':
-        if page_num < ((len(records) - 1) // 5):
-            page = page_num + 1
-        else:
-
-            await query.answer('This is the last page')
-            return
+        page = page_num + 1
+        records = await fetch_records(limit=PAGE_SIZE, offset=page * PAGE_SIZE, after=callback_data.cursor)
     else:
         if page_num > 0:
             page = page_num - 1
+            records = await fetch_records(limit=PAGE_SIZE, offset=page * PAGE_SIZE, before=callback_data.cursor)
         else:
             await query.answer('This is the first page')
             return
 
+    if not records:
+        await query.answer('This is the last page')
+        return
+
     with suppress(TelegramBadRequest):
-        pag = paginator(page, entity_type=callback_data.entity_type)
+        pag = paginator(page, entity_type=callback_data.entity_type, records=records)
         builder = InlineKeyboardBuilder()
-        start_index = page * 5
-        end_index = min(start_index + 5, len(records))
 
         if callback_data.entity_type == 'publications':
-            for i in range(start_index, end_index):
-                builder.row(InlineKeyboardButton(text=records[i].title, callback_data=f'publication_{records[i].id}'))
+            for record in records:
+                builder.row(InlineKeyboardButton(text=record.title, callback_data=f'publication_{record.id}'))
         elif callback_data.entity_type == 'students':
-            for i in range(start_index, end_index):
-                student_name = await student_name_builder(i)
-                builder.row(InlineKeyboardButton(text=student_name, callback_data=f'student_{records[i].user_id}'))
+            for record in records:
+                student_name = await student_name_builder(record)
+                builder.row(InlineKeyboardButton(text=student_name, callback_data=f'student_{record.user_id}'))
         elif callback_data.entity_type == 'courses':
-            for i in range(start_index, end_index):
-                builder.row(InlineKeyboardButton(text=records[i].name, callback_data=f'course_{records[i].id}'))
+            for record in records:
+                builder.row(InlineKeyboardButton(text=record.name, callback_data=f'course_{record.id}'))
         else:
-            for i in range(start_index, end_index):
-                student_name = await submission_name_builder(session, records[i].student)
-                builder.row(InlineKeyboardButton(text=student_name, callback_data=f'submission_{records[i].id}'))
+            for record, student_name in zip(records, await submission_names(session, records)):
+                builder.row(InlineKeyboardButton(text=student_name, callback_data=f'submission_{record.id}'))
 
         builder.row(*pag.buttons, width=2)
         await query.message.edit_reply_markup(reply_markup=builder.as_markup())
@@ -175,7 +188,7 @@ async def create_inline_courses(courses, message, kb):
         None
     """
     if courses:
-        pag = paginator(entity_type='courses')
+        pag = paginator(entity_type='courses', records=courses)
         builder = InlineKeyboardBuilder()
         for course in courses:
             builder.row(InlineKeyboardButton(text=course.name, callback_data=f'course_{course.id}'))
@@ -201,9 +214,9 @@ async def publications(message: Message, session: AsyncSession, state: FSMContex
         None
     """
     data = await state.get_data()
-    posts = await get_publications(session, data['course_id'], 5)
+    posts = await get_publications(session, data['course_id'], PAGE_SIZE)
     if posts:
-        pag = paginator()
+        pag = paginator(records=posts)
         builder = InlineKeyboardBuilder()
         for post in posts:
             builder.row(InlineKeyboardButton(text=post.title, callback_data=f'publication_{post.id}'))
@@ -279,18 +292,17 @@ async def media_group_send(message: Message, media_group: list, audio: list, doc
     Returns:
         None
     """
-    if media_group:
-        if len(media_group) <= 10:
-            await message.answer_media_group(media_group)
-        else:
-            await message.answer_media_group(media_group[:10])
-            await message.answer_media_group(media_group[11:])
+    # Telegram takes at most 10 items in a media group
+    for start in range(0, len(media_group), 10):
+        await message.answer_media_group(media_group[start:start + 10])
     if documents:
         await message.answer('Documents:')
-        await message.answer_media_group(documents)
+        for start in range(0, len(documents), 10):
+            await message.answer_media_group(documents[start:start + 10])
     if audio:
         await message.answer('Audio:')
-        await message.answer_media_group(audio)
+        for start in range(0, len(audio), 10):
+            await message.answer_media_group(audio[start:start + 10])
 
 
 async def single_publication(callback: CallbackQuery, session: AsyncSession, kb, user='teacher'):
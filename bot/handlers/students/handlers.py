@@ -1,3 +1,5 @@
+from functools import partial
+
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
@@ -40,8 +42,7 @@ async def pagination_handler_student(query: CallbackQuery, callback_data: Pagina
         callback_data (Pagination): The pagination callback data.
         session (AsyncSession): The asynchronous database session.
     """
-    courses = await get_courses_student(session, query.from_user.id)
-    await pagination_handler(query, callback_data, courses)
+    await pagination_handler(query, callback_data, partial(get_courses_student, session, query.from_user.id))
 
 
 @router.message(F.text == 'My courses')
@@ -86,8 +87,7 @@ async def pagination_handler_student(query: CallbackQuery, callback_data: Pagina
     """
     data = await state.get_data()
     course_id = data['course_id']
-    posts = await get_publications(session, course_id)
-    await pagination_handler(query, callback_data, posts)
+    await pagination_handler(query, callback_data, partial(get_publications, session, course_id))
 
 
 @router.message(F.text == 'Publications', CourseInteract.single_course)
@@ -219,8 +219,7 @@ async def add_submission_ready(message: Message, session: AsyncSession, state: F
 
     submission = await create_submission(session, data, message.from_user.id)
 
-    for media in data['media']:
-        await create_media(session, media, submission=submission)
+    await create_media(session, data['media'], submission_id=submission.id)
 
     await message.answer('Submission has been added', reply_markup=kb.single_course)
     await added_submission(session, data)
@@ -1,7 +1,6 @@
-from bot.__main__ import bot
 from bot.db.queries import get_user, get_course_by_id, get_single_publication
-from bot.handlers.common.keyboards import main
 from bot.handlers.common.services import student_name_builder
+from bot.outbox import notify
 
 
 async def joined_course(name, teacher):
@@ -12,8 +11,7 @@ async def joined_course(name, teacher):
         name (str): The name of the course.
         teacher (int): The user ID of the teacher.
     """
-    await bot.send_message(chat_id=teacher, text=f'New student just joined your "{name}" course',
-                           reply_markup=main)
+    await notify(teacher, f'New student just joined your "{name}" course')
 
 
 async def left_course(session, data, student):
@@ -29,9 +27,7 @@ async def left_course(session, data, student):
     student_name = await student_name_builder(user)
 
     course = await get_course_by_id(session, data['course_id'])
-    await bot.send_message(chat_id=course.teacher,
-                           text=f'{student_name} just left your "{course.name}" course',
-                           reply_markup=main)
+    await notify(course.teacher, f'{student_name} just left your "{course.name}" course')
 
 
 async def added_submission(session, data):
@@ -44,9 +40,8 @@ async def added_submission(session, data):
     """
     course = await get_course_by_id(session, data['course_id'])
     publication = await get_single_publication(session, data['publication_id'])
-    await bot.send_message(chat_id=course.teacher,
-                           text=f'Student just added a new submission to "{publication.title}" in your "{course.name}" course',
-                           reply_markup=main)
+    await notify(course.teacher,
+                 f'Student just added a new submission to "{publication.title}" in your "{course.name}" course')
 
 
 async def deleted_submission(session, data):
@@ -60,6 +55,5 @@ async def deleted_submission(session, data):
     course = await get_course_by_id(session, data['course_id'])
     publication = await get_single_publication(session, data['publication_id'])
 
-    await bot.send_message(chat_id=course.teacher,
-                           text=f'Student just deleted his submission of "{publication.title}" in your "{course.name}" course',
-                           reply_markup=main)
+    await notify(course.teacher,
+                 f'Student just deleted his submission of "{publication.title}" in your "{course.name}" course')
@@ -1,15 +1,9 @@
 from aiogram.filters import Filter
 from aiogram.types import Message
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from bot.db.queries import get_user
 
 
 class Teacher(Filter):
+    """Passes updates from teachers, the role is resolved once per update by UserRoleMiddleware"""
 
-    async def __call__(self, message: Message, session: AsyncSession) -> bool:
-        user = await get_user(session, message.from_user.id)
-        try:
-            return user.is_teacher
-        except AttributeError:
-            return False
+    async def __call__(self, message: Message, is_teacher: bool = False) -> bool:
+        return is_teacher
@@ -1,3 +1,5 @@
+from functools import partial
+
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
@@ -15,7 +17,7 @@ from bot.db.queries import get_students, delete_course, get_publications, delete
 from bot.handlers.common.keyboards import choose, choose_ultimate
 from bot.handlers.common.services import CourseInteract, publications, create_inline_courses, course_info, \
     single_publication, Pagination, pagination_handler, paginator, student_name_builder, add_media, \
-    submission_name_builder, single_submission
+    submission_names, single_submission
 from bot.handlers.tutors import keyboards as kb
 from bot.handlers.tutors.filters import Teacher
 from bot.handlers.tutors.notifications import publication_edited, submission_graded, student_kicked, publication_deleted, \
@@ -36,8 +38,7 @@ async def tutor_change_role(message: Message, session: AsyncSession):
                        Pagination.filter(F.entity_type == 'courses'))
 async def pagination_handler_courses(query: CallbackQuery, callback_data: Pagination, session: AsyncSession):
     """Handle pagination for courses when navigating through them."""
-    courses = await get_courses_teacher(session, query.from_user.id)
-    await pagination_handler(query, callback_data, courses)
+    await pagination_handler(query, callback_data, partial(get_courses_teacher, session, query.from_user.id))
 
 
 @router.message(Teacher(), F.text == 'My courses')
@@ -68,8 +69,7 @@ async def pagination_handler_teacher(query: CallbackQuery, callback_data: Pagina
     """Handle pagination for publications and students within a specific course for a teacher."""
     data = await state.get_data()
     course_id = data['course_id']
-    posts = await get_publications(session, course_id)
-    await pagination_handler(query, callback_data, posts)
+    await pagination_handler(query, callback_data, partial(get_publications, session, course_id))
 
 
 @router.message(Teacher(), F.text == 'Publications', CourseInteract.single_course)
@@ -85,8 +85,7 @@ async def pagination_handler_students(query: CallbackQuery, callback_data: Pagin
     """Handle pagination of students within a specific course for a teacher."""
     data = await state.get_data()
     course_id = data['course_id']
-    students = await get_students(session, course_id)
-    await pagination_handler(query, callback_data, students)
+    await pagination_handler(query, callback_data, partial(get_students, session, course_id))
 
 
 @router.message(Teacher(), F.text == 'Students', CourseInteract.single_course)
@@ -96,7 +95,7 @@ async def students(message: Message, session: AsyncSession, state: FSMContext):
     course_id = data['course_id']
     students = await get_students(session, course_id, 5)
     if students:
-        pag = paginator(entity_type='students')
+        pag = paginator(entity_type='students', records=students)
         builder = InlineKeyboardBuilder()
         for student in students:
             student_name = await student_name_builder(student)
@@ -203,8 +202,7 @@ async def add_publication_ready(message: Message, session: AsyncSession, state:
 
     publication = await create_publication(session, data)
 
-    for media in data['media']:
-        await create_media(session, media, publication=publication)
+    await create_media(session, data['media'], publication_id=publication.id)
 
     await message.answer('Publication has been created')
     await state.set_state(AddPublication.grade)
@@ -281,8 +279,7 @@ async def pagination_handler_submissions(query: CallbackQuery, callback_data: Pa
                                          state: FSMContext):
     """Handle pagination for submissions within a publication for a teacher."""
     data = await state.get_data()
-    submissions = await get_submissions(session, data['publication_id'])
-    await pagination_handler(query, callback_data, submissions, session)
+    await pagination_handler(query, callback_data, partial(get_submissions, session, data['publication_id']), session)
 
 
 @router.message(Teacher(), F.text == 'Submissions', PublicationInteract.interact)
@@ -291,10 +288,9 @@ async def submissions(message: Message, session: AsyncSession, state: FSMContext
     data = await state.get_data()
     submissions = await get_submissions(session, data['publication_id'], 5)
     if submissions:
-        pag = paginator(entity_type='submissions')
+        pag = paginator(entity_type='submissions', records=submissions)
         builder = InlineKeyboardBuilder()
-        for submission in submissions:
-            student_name = await submission_name_builder(session, submission.student)
+        for submission, student_name in zip(submissions, await submission_names(session, submissions)):
             builder.row(InlineKeyboardButton(text=student_name, callback_data=f'submission_{submission.id}'))
 
         builder.row(*pag.buttons, width=2)
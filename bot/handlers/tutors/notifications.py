@@ -1,8 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from bot.__main__ import bot
 from bot.db.queries import get_course_by_id, get_single_publication, get_students
-from bot.handlers.common.keyboards import main
+from bot.outbox import coalesce, enqueue, notify
 
 
 async def publication_added(session: AsyncSession, data):
@@ -16,9 +15,7 @@ async def publication_added(session: AsyncSession, data):
     course = await get_course_by_id(session, data['course_id'])
     students = await get_students(session, data['course_id'])
 
-    for student in students:
-        await bot.send_message(chat_id=student.user_id, text=f'New publication in course "{course.name}"',
-                               reply_markup=main)
+    await coalesce(students, f'New publication in course "{course.name}"', data['course_id'])
 
 
 async def student_kicked(session, data):
@@ -30,8 +27,7 @@ async def student_kicked(session, data):
         data (dict): Additional data, including the course ID and student ID.
     """
     course = await get_course_by_id(session, data['course_id'])
-    await bot.send_message(chat_id=data['student_id'], text=f'You have been kicked from "{course.name}"',
-                           reply_markup=main)
+    await notify(data['student_id'], f'You have been kicked from "{course.name}"')
 
 
 async def course_renamed(session, data, old_name):
@@ -45,10 +41,7 @@ async def course_renamed(session, data, old_name):
     """
     students = await get_students(session, data['course_id'])
 
-    for student in students:
-        await bot.send_message(chat_id=student.user_id,
-                               text=f'Course "{old_name}" name has been changed to "{data["name"]}"',
-                               reply_markup=main)
+    await coalesce(students, f'Course "{old_name}" name has been changed to "{data["name"]}"', data['course_id'])
 
 
 async def course_deleted(data):
@@ -60,10 +53,7 @@ async def course_deleted(data):
     """
     course_name, students = data
 
-    for student in students:
-        await bot.send_message(chat_id=student,
-                               text=f'Course "{course_name}" has been deleted',
-                               reply_markup=main)
+    await enqueue(students, f'Course "{course_name}" has been deleted')
 
 
 async def publication_deleted(session, data):
@@ -78,10 +68,7 @@ async def publication_deleted(session, data):
 
     students = await get_students(session, data['course_id'])
 
-    for student in students:
-        await bot.send_message(chat_id=student.user_id,
-                               text=f'Publication in "{course.name}" has been deleted',
-                               reply_markup=main)
+    await coalesce(students, f'Publication in "{course.name}" has been deleted', data['course_id'])
 
 
 async def publication_edited(session, data):
@@ -100,10 +87,7 @@ async def publication_edited(session, data):
         publication_title = data['title']
     students = await get_students(session, data['course_id'])
 
-    for student in students:
-        await bot.send_message(chat_id=student.user_id,
-                               text=f'Publication "{publication_title}" in "{course.name}" has been edited',
-                               reply_markup=main)
+    await coalesce(students, f'Publication "{publication_title}" in "{course.name}" has been edited', data['course_id'])
 
 
 async def submission_graded(session, data, grade):
@@ -116,6 +100,5 @@ async def submission_graded(session, data, grade):
         grade (int): The grade assigned to the submission.
     """
     publication = await get_single_publication(session, data['publication_id'])
-    await bot.send_message(chat_id=data['student_id'],
-                           text=f'Your submission for "{publication.title}" was graded for {grade}/{data["max_grade"]}',
-                           reply_markup=main)
+    await notify(data['student_id'],
+                 f'Your submission for "{publication.title}" was graded for {grade}/{data["max_grade"]}')
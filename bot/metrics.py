@@ -0,0 +1,244 @@
+"""
+Process metrics in the Prometheus text format, served on /metrics when METRICS-PORT is set.
+
+Every update gets an UpdateStats object in a context variable, the SQL, Redis and Bot API hooks count their calls
+into it, so the calls can be attributed to the update that made them.
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+from aiohttp import web
+from aioredis.connection import Connection
+from sqlalchemy import event
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CALL_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+registry = []
+collectors = []
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        registry.append(self)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type}'
+        for labels, value in self.values.items():
+            yield f'{self.name}{_labels(self.labels, labels)} {value}'
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, *labels, value: float):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float):
+        counts, total = self.values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type}'
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(self.labels, labels, [("le", bound)])} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {total[0]}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {cumulative}'
+
+
+updates = Counter('bot_updates_total', 'Updates received, by type', ['type'])
+update_errors = Counter('bot_update_errors_total', 'Updates that raised, by type', ['type'])
+update_latency = Histogram('bot_update_seconds', 'Time to process an update, by type', ['type'])
+handler_latency = Histogram('bot_handler_seconds', 'Time spent in a handler', ['router', 'handler'])
+handler_errors = Counter('bot_handler_errors_total', 'Handlers that raised', ['router', 'handler'])
+sql_calls = Counter('bot_sql_statements_total', 'SQL statements executed')
+redis_calls = Counter('bot_redis_commands_total', 'Redis round trips (a pipeline is one)')
+api_calls = Counter('bot_api_requests_total', 'Bot API requests, by method', ['method'])
+api_errors = Counter('bot_api_errors_total', 'Failed Bot API requests, by method', ['method'])
+api_latency = Histogram('bot_api_seconds', 'Bot API request latency, by method', ['method'])
+calls_per_update = Histogram('bot_calls_per_update', 'SQL statements, Redis round trips and Bot API requests '
+                                                     'made while handling one update', ['kind'], CALL_BUCKETS)
+cache_l1 = Gauge('bot_cache_l1', 'In-process cache counters', ['stat'])
+
+
+@dataclass
+class UpdateStats:
+    """Calls made on behalf of the update being handled"""
+    sql: int = 0
+    redis: int = 0
+    api: int = 0
+    update_type: Optional[str] = None
+    handler: Optional[str] = None
+    statements: Dict[str, int] = field(default_factory=dict)  # executions of every distinct statement
+
+
+current = ContextVar('update_stats', default=None)
+
+
+def count(kind: str):
+    stats = current.get()
+    if stats is not None:
+        setattr(stats, kind, getattr(stats, kind) + 1)
+
+
+def render() -> str:
+    for collect in collectors:
+        collect()
+    return '\n'.join(line for metric in registry for line in metric.render()) + '\n'
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer update middleware, times every update and reports the calls made for it"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any],
+    ) -> Any:
+        event_type = event.event_type
+        stats = UpdateStats(update_type=event_type)
+        token = current.set(stats)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            update_errors.inc(event_type)
+            raise
+        finally:
+            update_latency.observe(event_type, value=time.perf_counter() - started)
+            updates.inc(event_type)
+            for kind in ('sql', 'redis', 'api'):
+                calls_per_update.observe(kind, value=getattr(stats, kind))
+            current.reset(token)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware of the event observers, times the handler that was picked for an event"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        callback = data['handler'].callback
+        labels = (callback.__module__.removeprefix('bot.handlers.'), callback.__name__)
+        stats = current.get()
+        if stats is not None:
+            stats.handler = '.'.join(labels)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(*labels)
+            raise
+        finally:
+            handler_latency.observe(*labels, value=time.perf_counter() - started)
+
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session middleware, counts and times the outgoing Bot API requests"""
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        count('api')
+        api_calls.inc(name)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            api_errors.inc(name)
+            raise
+        finally:
+            api_latency.observe(name, value=time.perf_counter() - started)
+
+
+class CountingConnection(Connection):
+    """Redis connection that counts the commands it sends"""
+
+    async def send_packed_command(self, command, check_health: bool = True):
+        count('redis')
+        redis_calls.inc()
+        return await super().send_packed_command(command, check_health)
+
+
+def instrument_engine(engine):
+    """Counts the statements an async engine executes"""
+
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(*args):
+        count('sql')
+        sql_calls.inc()
+
+
+def watch_cache(local_cache):
+    """Reports the counters of an in-process cache on every scrape"""
+
+    def collect():
+        for stat, value in local_cache.stats().items():
+            cache_l1.set(stat, value=value)
+
+    collectors.append(collect)
+
+
+def instrument_dispatcher(dp):
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    for name, observer in dp.observers.items():
+        if name not in ('update', 'error'):
+            observer.middleware(HandlerMetricsMiddleware())
+
+
+async def serve(port: int) -> web.AppRunner:
+    """Starts the /metrics endpoint"""
+
+    async def handle(request):
+        return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', port).start()
+    return runner
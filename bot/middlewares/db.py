@@ -4,8 +4,46 @@ from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
+from bot.db import cache
+
+
+class LazySession:
+    """
+    Stands in for the AsyncSession of one update and opens it on first use, so updates that never reach the
+    database (handled without it or served from the cache) don't create a session or touch the pool.
+    Used as a context manager it commits on a clean exit and rolls back on an exception, if it was opened.
+    """
+
+    def __init__(self, session_pool: async_sessionmaker):
+        self._session_pool = session_pool
+        self._session = None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._session_pool()
+        return getattr(self._session, name)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._session is None:
+            return
+        try:
+            if exc_type is None:
+                await self._session.commit()
+            else:
+                await self._session.rollback()
+        finally:
+            await self._session.close()
+
 
 class DbSessionMiddleware(BaseMiddleware):
+    """
+    Runs every update in one transaction: it is committed once after the handler returns and rolled back if it
+    raises. Cache invalidations and notifications made meanwhile are flushed after the commit.
+    The session is opened only when the update first uses it.
+    """
     def __init__(self, session_pool: async_sessionmaker):
         super().__init__()
         self.session_pool = session_pool
@@ -16,6 +54,7 @@ class DbSessionMiddleware(BaseMiddleware):
             event: TelegramObject,
             data: Dict[str, Any],
     ) -> Any:
-        async with self.session_pool() as session:
-            data["session"] = session
-            return await handler(event, data)
+        async with cache.collect_invalidations():
+            async with LazySession(self.session_pool) as session:
+                data["session"] = session
+                return await handler(event, data)
@@ -0,0 +1,25 @@
+from typing import Callable, Awaitable, Dict, Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot.db.queries import get_user
+
+
+class UserRoleMiddleware(BaseMiddleware):
+    """
+    Resolves the user behind an update once, before routing, and puts it into the handler data
+    as 'user' and 'is_teacher', so filters don't have to look it up for every handler they are checked against.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get('event_from_user')
+        user = await get_user(data['session'], from_user.id) if from_user else None
+        data['user'] = user
+        data['is_teacher'] = bool(user and user.is_teacher)
+        return await handler(event, data)
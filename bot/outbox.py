@@ -0,0 +1,158 @@
+import json
+import os
+import time
+from typing import Iterable
+
+from bot.__main__ import redis_queue as redis
+from bot.db import cache
+
+STREAM = 'outbox'
+GROUP = 'senders'
+MAX_LENGTH = 100000
+DIGESTS = 'digests'
+DAY = 60 * 60 * 24
+COALESCE_WINDOW = int(os.getenv('NOTIFY-WINDOW', 60))
+DIGEST_HOUR = int(os.getenv('DIGEST-HOUR', 18))  # UTC
+MAX_DIGEST_LINES = 30
+RETRIES = 'outbox:retries'
+RETRY_DELAY = int(os.getenv('RETRY-DELAY', 30))
+
+# Moves the digests that are due into the outbox: duplicate lines are merged,
+# a single line goes out as is and several are sent as one list
+_FLUSH_DIGESTS = """
+local due = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'limit', 0, ARGV[2])
+for _, member in ipairs(due) do
+    local key = 'digest:' .. member
+    local lines, seen = {}, {}
+    for _, line in ipairs(redis.call('lrange', key, 0, -1)) do
+        if not seen[line] then
+            seen[line] = true
+            table.insert(lines, line)
+        end
+    end
+    redis.call('del', key)
+    redis.call('zrem', KEYS[1], member)
+    local text = lines[1]
+    if #lines > 1 then
+        local shown = {unpack(lines, 1, math.min(#lines, tonumber(ARGV[4])))}
+        text = 'Course updates:\\n• ' .. table.concat(shown, '\\n• ')
+        if #lines > #shown then
+            text = text .. '\\n…and ' .. (#lines - #shown) .. ' more'
+        end
+    end
+    if text then
+        redis.call('xadd', KEYS[2], 'maxlen', '~', ARGV[3], '*',
+                   'chat_id', string.match(member, '(-?%d+)$'), 'text', text, 'keyboard', 'main', 'attempt', '0')
+    end
+end
+return #due
+"""
+
+# Moves the retries that are due back into the outbox
+_FLUSH_RETRIES = """
+local due = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'limit', 0, ARGV[2])
+for _, member in ipairs(due) do
+    local chat_id, text, keyboard, attempt = unpack(cjson.decode(member))
+    redis.call('xadd', KEYS[2], 'maxlen', '~', ARGV[3], '*',
+               'chat_id', chat_id, 'text', text, 'keyboard', keyboard, 'attempt', attempt)
+    redis.call('zrem', KEYS[1], member)
+end
+return #due
+"""
+
+
+def job(chat_id: int, text: str, keyboard: str = 'main', attempt: int = 0):
+    """Fields of one outbox entry, a message to a single chat"""
+    return {'chat_id': chat_id, 'text': text, 'keyboard': keyboard, 'attempt': attempt}
+
+
+async def enqueue(chat_ids: Iterable[int], text: str, keyboard: str = 'main'):
+    """
+    Appends a notification for every chat to the outbox stream, delivered by the `python -m bot.worker` process.
+    Within an update it is appended once the update's changes are committed.
+
+    Args:
+        chat_ids (Iterable[int]): The recipients.
+        text (str): The message text.
+        keyboard (str): Name of the reply keyboard from bot.handlers.common.keyboards.
+    """
+    chat_ids = list(dict.fromkeys(chat_ids))
+    if chat_ids:
+        await cache.after_commit(_append, chat_ids, text, keyboard)
+
+
+async def _append(chat_ids, text, keyboard):
+    async with redis.pipeline(transaction=True) as pipe:
+        for chat_id in chat_ids:
+            pipe.xadd(STREAM, job(chat_id, text, keyboard), maxlen=MAX_LENGTH)
+        await pipe.execute()
+
+
+async def notify(chat_id: int, text: str, keyboard: str = 'main'):
+    """Appends a notification for a single chat"""
+    await enqueue([chat_id], text, keyboard)
+
+
+def next_digest_time(now: float) -> float:
+    """The next DIGEST-HOUR o'clock, when daily digests are sent"""
+    due = now - now % DAY + DIGEST_HOUR * 60 * 60
+    return due if due > now else due + DAY
+
+
+async def coalesce(students, text: str, course_id: int):
+    """
+    Collects a course notification into per-student digests instead of sending it right away.
+    Notifications of one course that arrive within NOTIFY-WINDOW seconds of the first one are sent as one message,
+    students who chose the daily digest get theirs once a day. Like enqueue, it waits for the commit of the update.
+
+    Args:
+        students (Iterable[UserView]): The recipients.
+        text (str): The notification line.
+        course_id (int): The course the notification is about.
+    """
+    recipients = [(student.user_id, student.daily_digest) for student in students]
+    if recipients:
+        await cache.after_commit(_collect, recipients, text, course_id)
+
+
+async def _collect(recipients, text, course_id):
+    now = time.time()
+    async with redis.pipeline(transaction=True) as pipe:
+        for user_id, daily_digest in recipients:
+            if daily_digest:
+                member, due = f'daily:{user_id}', next_digest_time(now)
+            else:
+                member, due = f'{course_id}:{user_id}', now + COALESCE_WINDOW
+            pipe.rpush(f'digest:{member}', text)
+            pipe.expire(f'digest:{member}', 2 * DAY)
+            # only the first notification of a burst sets the time the digest goes out
+            pipe.zadd(DIGESTS, {member: due}, nx=True)
+        await pipe.execute()
+
+
+async def flush_digests(limit: int = 1000) -> int:
+    """Moves the digests that are due into the outbox, returns how many were flushed"""
+    return await redis.eval(_FLUSH_DIGESTS, 2, DIGESTS, STREAM, time.time(), limit, MAX_LENGTH, MAX_DIGEST_LINES)
+
+
+def retry(pipe, entry_id: str, chat_id: int, text: str, keyboard: str, attempt: int):
+    """
+    Queues on a pipeline the redelivery of an outbox entry that may go through later.
+    It is moved back into the stream by flush_retries after RETRY-DELAY seconds, doubled with every attempt.
+    """
+    # the entry id keeps retries of the same message to a chat apart
+    member = json.dumps([str(chat_id), text, keyboard, str(attempt), entry_id])
+    pipe.zadd(RETRIES, {member: time.time() + RETRY_DELAY * 2 ** (attempt - 1)})
+
+
+async def flush_retries(limit: int = 1000) -> int:
+    """Moves the retries that are due into the outbox, returns how many were flushed"""
+    return await redis.eval(_FLUSH_RETRIES, 2, RETRIES, STREAM, time.time(), limit, MAX_LENGTH)
+
+
+async def next_retry_in(limit: float) -> float:
+    """Seconds until the next retry is due, at most limit"""
+    head = await redis.zrange(RETRIES, 0, 0, withscores=True)
+    if not head:
+        return limit
+    return min(max(head[0][1] - time.time(), 0), limit)
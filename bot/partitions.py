@@ -0,0 +1,155 @@
+"""
+Spreads updates over several bot processes.
+
+The process that receives updates (polling or webhook) forwards them to one Redis stream per partition, picked by
+a jump consistent hash of the chat id. Each partition is consumed by one process started with DISPATCH-PARTITION
+set, which handles different chats concurrently and the updates of one chat strictly in order.
+All processes share the FSM storage and the cache through Redis.
+
+`python -m bot.partitions` prints the lag of every partition.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import Update
+from aioredis.exceptions import ResponseError
+
+from bot.__main__ import redis_queue as redis
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS = int(os.getenv('DISPATCH-PARTITIONS', 0))
+PARTITION = os.getenv('DISPATCH-PARTITION')  # set in the processes that handle a partition
+CONCURRENCY = int(os.getenv('DISPATCH-CONCURRENCY', 16))
+GROUP = 'dispatchers'
+HEARTBEATS = 'dispatch:heartbeats'
+MAX_LENGTH = 100000
+BATCH = 100
+BLOCK_MS = 5000
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash, only 1/n of the chats move to another partition when one is added"""
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def stream(partition: int) -> str:
+    return f'updates:{partition}'
+
+
+class UpdateForwarder(BaseMiddleware):
+    """Outer update middleware of the receiving process, it hands updates to the partitions instead of the routers"""
+
+    def __init__(self, partitions: int):
+        self.partitions = partitions
+
+    async def __call__(
+            self,
+            handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any],
+    ) -> Any:
+        chat, user = data.get('event_chat'), data.get('event_from_user')
+        key = chat.id if chat else user.id if user else event.update_id
+        await redis.xadd(stream(jump_hash(key, self.partitions)),
+                         {'chat': key, 'update': event.model_dump_json(exclude_unset=True)}, maxlen=MAX_LENGTH)
+
+
+async def consume(dp: Dispatcher, bot: Bot, partition: int):
+    """Handles the updates of one partition until cancelled"""
+    name, consumer = stream(partition), f'partition-{partition}'
+    try:
+        await redis.xgroup_create(name, GROUP, id='0', mkstream=True)
+    except ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+    slots = asyncio.Semaphore(CONCURRENCY)
+    tails = {}
+
+    async def handle(previous, entry_id, update):
+        try:
+            if previous:
+                # updates of a chat are handled one after another, in the order they came
+                await asyncio.wait([previous])
+            await dp.feed_update(bot, update)
+        except Exception:
+            logger.exception('Update %s failed', update.update_id)
+        finally:
+            await redis.xack(name, GROUP, entry_id)
+            slots.release()
+
+    def forget(chat, task):
+        if tails.get(chat) is task:
+            del tails[chat]
+
+    # the entries this partition read but didn't acknowledge before a restart come first
+    last_id = '0'
+    while True:
+        reply = await redis.xreadgroup(GROUP, consumer, {name: last_id}, count=BATCH, block=BLOCK_MS)
+        entries = reply[0][1] if reply else []
+        if last_id != '>':
+            last_id = entries[-1][0] if entries else '>'
+        for entry_id, fields in entries:
+            if not fields:
+                # trimmed from the stream while pending
+                await redis.xack(name, GROUP, entry_id)
+                continue
+            await slots.acquire()
+            chat = int(fields[b'chat'])
+            update = Update.model_validate_json(fields[b'update'], context={'bot': bot})
+            task = asyncio.create_task(handle(tails.get(chat), entry_id, update))
+            tails[chat] = task
+            task.add_done_callback(lambda done, chat=chat: forget(chat, done))
+        await redis.hset(HEARTBEATS, partition, time.time())
+
+
+def entry_age(entry_id) -> float:
+    """Seconds since a stream entry was added, its id starts with the time in milliseconds"""
+    if not entry_id:
+        return 0.0
+    return max(time.time() - int(entry_id.split(b'-')[0]) / 1000, 0.0)
+
+
+async def health(partitions: int = PARTITIONS):
+    """Backlog of every partition: entries not read yet, read but unacknowledged, and how old the oldest one is"""
+    heartbeats = await redis.hgetall(HEARTBEATS)
+    report = []
+    for partition in range(partitions):
+        name = stream(partition)
+        try:
+            group = next((group for group in await redis.xinfo_groups(name) if group['name'] == GROUP.encode()), {})
+            pending = await redis.xpending(name, GROUP)
+        except ResponseError:
+            group, pending = {}, {'pending': 0, 'min': None}
+        heartbeat = heartbeats.get(str(partition).encode())
+        report.append({
+            'partition': partition,
+            'length': await redis.xlen(name),
+            'lag': group.get('lag'),
+            'pending': pending['pending'],
+            'oldest_pending_s': round(entry_age(pending['min']), 1),
+            'heartbeat_s': round(time.time() - float(heartbeat), 1) if heartbeat else None,
+        })
+    return report
+
+
+async def main():
+    for row in await health():
+        print('  '.join(f'{key}={value}' for key, value in row.items()))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    asyncio.run(main())
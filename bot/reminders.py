@@ -0,0 +1,85 @@
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.__main__ import redis_queue as redis
+from bot.db import Publications, cache
+
+REMINDERS = 'reminders'
+# how long before the deadline students are reminded, in seconds
+LEADS = (60 * 60 * 24, 60 * 60)
+BOOTSTRAP_BATCH = 1000
+
+# Takes the reminders that are due out of the index, so every one of them is sent by a single worker
+_POP_DUE = """
+local due = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'limit', 0, ARGV[2])
+if #due > 0 then
+    redis.call('zrem', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+def members(publication_id):
+    return [f'{publication_id}:{lead}' for lead in LEADS]
+
+
+def reminder_times(publication_id, finish_date: datetime, now: float):
+    """Index entries of the reminders of a publication that are still ahead"""
+    deadline = finish_date.timestamp()
+    return {member: deadline - lead for member, lead in zip(members(publication_id), LEADS) if deadline - lead > now}
+
+
+async def schedule(publication_id: int, finish_date: datetime = None):
+    """(Re)indexes the reminders of a publication after its deadline was set or changed, once that is committed"""
+    await cache.after_commit(_index, publication_id, finish_date)
+
+
+async def _index(publication_id, finish_date):
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.zrem(REMINDERS, *members(publication_id))
+        if finish_date:
+            upcoming = reminder_times(publication_id, finish_date, time.time())
+            if upcoming:
+                pipe.zadd(REMINDERS, upcoming)
+        await pipe.execute()
+
+
+async def unschedule(*publication_ids: int):
+    """Drops the reminders of deleted publications, once the deletion is committed"""
+    if publication_ids:
+        await cache.after_commit(redis.zrem, REMINDERS, *(member for publication_id in publication_ids
+                                                          for member in members(publication_id)))
+
+
+async def bootstrap(session: AsyncSession):
+    """Indexes the upcoming deadlines from the database, e.g. after the Redis data was lost"""
+    now = time.time()
+    stmt = select(Publications.id, Publications.finish_date).where(
+        Publications.finish_date > datetime.fromtimestamp(now)).order_by(Publications.finish_date)
+    result = await session.stream(stmt)
+    async for rows in result.partitions(BOOTSTRAP_BATCH):
+        upcoming = {}
+        for publication_id, finish_date in rows:
+            upcoming.update(reminder_times(publication_id, finish_date, now))
+        if upcoming:
+            await redis.zadd(REMINDERS, upcoming)
+
+
+async def pop_due(limit: int = 100):
+    """
+    Returns the reminders that are due as (publication id, seconds before the deadline) pairs
+    and removes them from the index.
+    """
+    due = await redis.eval(_POP_DUE, 1, REMINDERS, time.time(), limit)
+    return [tuple(map(int, member.split(b':'))) for member in due]
+
+
+async def next_due_in(limit: float) -> float:
+    """Seconds until the next reminder is due, at most limit"""
+    head = await redis.zrange(REMINDERS, 0, 0, withscores=True)
+    if not head:
+        return limit
+    return min(max(head[0][1] - time.time(), 0), limit)
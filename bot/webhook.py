@@ -0,0 +1,81 @@
+import asyncio
+import os
+import ssl
+from typing import Any, Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import FSInputFile
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+WEBHOOK_URL = os.getenv('WEBHOOK-URL')  # public base url, the bot polls when it isn't set
+WEBHOOK_PATH = os.getenv('WEBHOOK-PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK-SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK-HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK-PORT', 443))
+WEBHOOK_CONCURRENCY = int(os.getenv('WEBHOOK-CONCURRENCY', 32))
+# a self-signed certificate, only needed when nothing in front of the bot terminates TLS
+WEBHOOK_CERT = os.getenv('WEBHOOK-CERT')
+WEBHOOK_KEY = os.getenv('WEBHOOK-KEY')
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Acknowledges every update to Telegram right away and processes it in the background,
+    with at most `concurrency` updates in the handlers at a time.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, concurrency: int, **kwargs: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.tasks = set()
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        async with self.semaphore:
+            await super()._background_feed_update(bot, update)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self) -> None:
+        # let the updates Telegram was already told about finish before the session goes away
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        await super().close()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, concurrency: int = WEBHOOK_CONCURRENCY, background: bool = True):
+    """
+    Registers the webhook with Telegram and serves updates until cancelled.
+    Without background an update is answered only after it was handled, so Telegram redelivers it if that fails.
+    """
+    app = web.Application()
+    if background:
+        handler = BoundedRequestHandler(dispatcher=dp, bot=bot, concurrency=concurrency,
+                                        secret_token=WEBHOOK_SECRET)
+    else:
+        handler = SimpleRequestHandler(dispatcher=dp, bot=bot, handle_in_background=False,
+                                       secret_token=WEBHOOK_SECRET)
+    handler.register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    ssl_context = None
+    if WEBHOOK_CERT:
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ssl_context.load_cert_chain(WEBHOOK_CERT, WEBHOOK_KEY)
+    await bot.set_webhook(f'{WEBHOOK_URL.rstrip("/")}{WEBHOOK_PATH}', secret_token=WEBHOOK_SECRET,
+                          certificate=FSInputFile(WEBHOOK_CERT) if WEBHOOK_CERT else None,
+                          max_connections=min(concurrency, 100),
+                          allowed_updates=dp.resolve_used_update_types())
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT, ssl_context=ssl_context).start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
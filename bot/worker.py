@@ -0,0 +1,142 @@
+"""
+Delivers the notifications handlers append to the outbox stream.
+
+Run with `python -m bot.worker`, any number of workers share the stream through one consumer group
+and the Telegram rate limits through the schedule bot.broadcast keeps in Redis.
+An entry is acknowledged only after its message was sent or rejected for good, entries of a worker that died
+are claimed by the others once they have been pending for CLAIM_IDLE_MS.
+Messages that may go through later are put back into the stream after a growing delay.
+Between reads the worker also moves due course digests and retries into the stream and sends the deadline reminders
+that are due, it never blocks on the stream past the next reminder or retry.
+"""
+import asyncio
+import logging
+import os
+import socket
+import sys
+
+from aioredis.exceptions import ResponseError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from bot import metrics, outbox, reminders
+from bot.__main__ import bot, redis_queue as redis
+from bot.broadcast import BroadcastResult, deliver
+from bot.db import profiling
+from bot.db.cache import listen_invalidations
+from bot.db.queries import get_course_by_id, get_single_publication, get_students_without_submission
+from bot.handlers.common import keyboards
+
+logger = logging.getLogger(__name__)
+
+BATCH = 100
+CONCURRENCY = int(os.getenv('BROADCAST-CONCURRENCY', 8))
+BLOCK_MS = 5000
+CLAIM_IDLE_MS = 60000
+MAX_REDELIVERIES = 5
+
+
+async def create_group():
+    try:
+        await redis.xgroup_create(outbox.STREAM, outbox.GROUP, id='0', mkstream=True)
+    except ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def decode(fields):
+    fields = {key.decode(): value.decode() for key, value in fields.items()}
+    return int(fields['chat_id']), fields['text'], fields['keyboard'], int(fields['attempt'])
+
+
+async def claim(consumer):
+    """Takes over entries left pending by workers that stopped without acknowledging them"""
+    reply = await redis.execute_command('XAUTOCLAIM', outbox.STREAM, outbox.GROUP, consumer, CLAIM_IDLE_MS,
+                                        '0-0', 'COUNT', BATCH)
+    entries = []
+    for entry in reply[1]:
+        if entry and entry[1]:
+            entry_id, values = entry
+            entries.append((entry_id, dict(zip(values[::2], values[1::2]))))
+    return entries
+
+
+async def read(consumer, block_ms):
+    reply = await redis.xreadgroup(outbox.GROUP, consumer, {outbox.STREAM: '>'}, count=BATCH, block=block_ms)
+    return reply[0][1] if reply else []
+
+
+async def process(entries):
+    """Sends a batch of entries with bounded concurrency and acknowledges them"""
+    result = BroadcastResult()
+    jobs = [(entry_id, *decode(fields)) for entry_id, fields in entries]
+    blocked = await redis.mget([f'blocked:{chat_id}' for _, chat_id, *_ in jobs])
+    queue = iter(zip(jobs, blocked))
+
+    async def sender():
+        for (entry_id, chat_id, text, keyboard, attempt), is_blocked in queue:
+            if is_blocked:
+                status = 'blocked'
+            else:
+                status = await deliver(chat_id, text, reply_markup=getattr(keyboards, keyboard))
+            async with redis.pipeline(transaction=True) as pipe:
+                if status == 'retried':
+                    if attempt < MAX_REDELIVERIES:
+                        outbox.retry(pipe, entry_id.decode(), chat_id, text, keyboard, attempt + 1)
+                    else:
+                        status = 'failed'
+                pipe.xack(outbox.STREAM, outbox.GROUP, entry_id)
+                await pipe.execute()
+            setattr(result, status, getattr(result, status) + 1)
+
+    await asyncio.gather(*(sender() for _ in range(min(CONCURRENCY, len(jobs)))))
+    logger.info('Outbox batch: %d delivered, %d failed, %d blocked, %d retried',
+                result.delivered, result.failed, result.blocked, result.retried)
+    return result
+
+
+async def send_reminders(session):
+    """Reminds the students who haven't submitted yet about the deadlines that are due"""
+    for publication_id, lead in await reminders.pop_due():
+        publication = await get_single_publication(session, publication_id)
+        if not publication:
+            continue
+        course = await get_course_by_id(session, publication.course_id)
+        students = await get_students_without_submission(session, publication_id, publication.course_id)
+        left = f'{lead // 3600} hours' if lead > 3600 else '1 hour'
+        await outbox.enqueue(students, f'Deadline for "{publication.title}" in "{course.name}" is in {left}')
+
+
+async def main():
+    consumer = f'{socket.gethostname()}-{os.getpid()}'
+    engine = create_async_engine(url=os.getenv('DB-URL'), echo=bool(os.getenv('SQL-ECHO')))
+    sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+    metrics.instrument_engine(engine)
+    profiling.instrument(engine)
+    bot.session.middleware(metrics.RequestMetricsMiddleware())
+    if os.getenv('METRICS-PORT'):
+        await metrics.serve(int(os.getenv('METRICS-PORT')))
+    await create_group()
+    # reminders read courses and publications through the in-process cache, it has to hear about renames
+    invalidations = asyncio.create_task(listen_invalidations())
+    try:
+        async with sessionmaker() as session:
+            await reminders.bootstrap(session)
+        while True:
+            await outbox.flush_digests()
+            await outbox.flush_retries()
+            async with sessionmaker() as session:
+                await send_reminders(session)
+            block_ms = int(await outbox.next_retry_in(await reminders.next_due_in(BLOCK_MS / 1000)) * 1000)
+            entries = await claim(consumer) or await read(consumer, max(block_ms, 1))
+            if entries:
+                await process(entries)
+    finally:
+        invalidations.cancel()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print('end of work')